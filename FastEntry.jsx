@@ -27,6 +27,7 @@ function FastEntry() {
     const [hasUnsavedChanges, setHasUnsavedChanges] = useState(false);
 
     const activeDateRef = useRef(date); // To track stale async results
+    const serverDataRef = useRef({}); // Last saved state from the server, used to PATCH only changed cells
     const isEffectivelyLocked = isLocked || dailyLocked;
 
     const gridRef = useRef(null);
@@ -73,6 +74,8 @@ function FastEntry() {
                 };
             });
 
+            serverDataRef.current = existingData;
+
             // Merge with draft if it exists in localStorage for this date
             const draftKey = `draft_${date}`;
             const draft = localStorage.getItem(draftKey);
@@ -350,13 +353,22 @@ function FastEntry() {
             if (!confirmed) return;
         }
 
-        const records = rooms.map(r => ({
-            date,
-            room_id: r.id,
-            bed_staff_id: gridData[r.id]?.bed_staff_id || null,
-            bath_staff_id: gridData[r.id]?.bath_staff_id || null,
-            towel_count: gridData[r.id]?.towel_count || 0
-        })).filter(rec => rec.bed_staff_id || rec.bath_staff_id || rec.towel_count > 0);
+        const cellOf = (data, roomId) => ({
+            room_id: roomId,
+            bed_staff_id: data[roomId]?.bed_staff_id || null,
+            bath_staff_id: data[roomId]?.bath_staff_id || null,
+            towel_count: data[roomId]?.towel_count || 0
+        });
+        const records = rooms.map(r => cellOf(gridData, r.id))
+            .filter(rec => rec.bed_staff_id || rec.bath_staff_id || rec.towel_count > 0);
+
+        // Only rooms that differ from the server state are sent
+        const changes = rooms.map(r => cellOf(gridData, r.id)).filter(cell => {
+            const saved = cellOf(serverDataRef.current, cell.room_id);
+            return cell.bed_staff_id !== saved.bed_staff_id
+                || cell.bath_staff_id !== saved.bath_staff_id
+                || cell.towel_count !== saved.towel_count;
+        });
 
         if (records.length === 0) {
             const confirmed = window.confirm('清掃入力がすべて空です。この日のデータを完全に削除（リセット）してよろしいですか？');
@@ -365,8 +377,7 @@ function FastEntry() {
 
         setSaving(true);
         try {
-            // Pass date as query param to allow resetting when records array is empty
-            await axios.post(`${API_BASE}/records?date=${date}`, records);
+            await axios.patch(`${API_BASE}/records/${date}`, changes);
             // Clear draft on successful save
             localStorage.removeItem(`draft_${date}`);
             alert('保存および集計を更新しました');
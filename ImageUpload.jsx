@@ -3,23 +3,95 @@ import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 
 const API_URL = 'http://127.0.0.1:8000/api/analyze';
+const BATCH_URL = 'http://127.0.0.1:8000/api/analyze/batch';
+
+// Rows of one page's OCR result (JSON array, possibly wrapped in ```json fences)
+const parseRows = (text) => {
+    try {
+        const rows = JSON.parse(text.replace(/```json/g, '').replace(/```/g, '').trim());
+        return Array.isArray(rows) ? rows : [];
+    } catch {
+        return [];
+    }
+};
+
+// POST the files and call onEvent(event, data) for every server-sent event
+const streamBatch = async (files, onEvent) => {
+    const formData = new FormData();
+    files.forEach((file) => formData.append('files', file));
+    const response = await fetch(BATCH_URL, { method: 'POST', body: formData });
+    if (!response.ok) {
+        throw new Error(`Batch analysis failed (${response.status})`);
+    }
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let end;
+        while ((end = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, end);
+            buffer = buffer.slice(end + 2);
+            const event = block.match(/^event: (.*)$/m)?.[1];
+            const data = block.match(/^data: (.*)$/m)?.[1];
+            if (event && data) onEvent(event, JSON.parse(data));
+        }
+    }
+};
+
+const pageLabel = (page) => (page.page ? `${page.filename} p.${page.page}` : page.filename);
 
 function ImageUpload() {
     const navigate = useNavigate();
-    const [selectedFile, setSelectedFile] = useState(null);
+    const [selectedFiles, setSelectedFiles] = useState([]);
     const [preview, setPreview] = useState(null);
     const [loading, setLoading] = useState(false);
+    const [pages, setPages] = useState([]); // batch progress: {index, filename, page, status}
+
+    const selectedFile = selectedFiles[0];
+    const isBatch = selectedFiles.length > 1 || selectedFile?.type === 'application/pdf';
 
     const handleFileChange = (e) => {
-        const file = e.target.files[0];
-        if (file) {
-            setSelectedFile(file);
-            setPreview(URL.createObjectURL(file));
+        const files = Array.from(e.target.files);
+        if (files.length) {
+            setSelectedFiles(files);
+            setPages([]);
+            setPreview(files[0].type.startsWith('image/') ? URL.createObjectURL(files[0]) : null);
+        }
+    };
+
+    const handleBatch = async () => {
+        setLoading(true);
+        const results = {};
+        try {
+            await streamBatch(selectedFiles, (event, data) => {
+                if (event === 'start') {
+                    setPages(data.pages.map((page) => ({ ...page, status: 'pending' })));
+                } else if (event === 'page' || event === 'error') {
+                    if (event === 'page') results[data.index] = parseRows(data.result);
+                    setPages((prev) => prev.map((page) => (
+                        page.index === data.index
+                            ? { ...page, status: event === 'page' ? 'done' : 'error', detail: data.detail }
+                            : page
+                    )));
+                }
+            });
+            // Pages finish in any order; keep the upload order for the confirmation screen
+            const rows = Object.keys(results).sort((a, b) => a - b).flatMap((index) => results[index]);
+            navigate('/confirm', { state: { analysisResult: JSON.stringify(rows) } });
+        } catch (error) {
+            console.error('Error analyzing images:', error);
+            alert('Error analyzing images. Please try again.');
+        } finally {
+            setLoading(false);
         }
     };
 
     const handleAnalyze = async () => {
         if (!selectedFile) return;
+        if (isBatch) return handleBatch();
 
         setLoading(true);
 
@@ -47,12 +119,14 @@ function ImageUpload() {
             <h2>Image Analysis</h2>
             <p style={{ marginBottom: '1.5rem', opacity: 0.8 }}>
                 Upload a photo of the daily report to extract staff Name, Room Number, and Cleaning Items.
+                Select several sheets (or a multi-page PDF) to analyze a whole day at once.
             </p>
 
             <div className="form-group" style={{ flexDirection: 'column', alignItems: 'flex-start' }}>
                 <input
                     type="file"
-                    accept="image/*"
+                    accept="image/*,application/pdf"
+                    multiple
                     onChange={handleFileChange}
                     style={{ width: '100%' }}
                 />
@@ -67,6 +141,17 @@ function ImageUpload() {
                     </div>
                 )}
 
+                {pages.length > 0 && (
+                    <ul style={{ marginTop: '1rem', width: '100%', listStyle: 'none', padding: 0 }}>
+                        {pages.map((page) => (
+                            <li key={page.index} style={{ opacity: page.status === 'pending' ? 0.6 : 1 }}>
+                                {page.status === 'done' ? '✓' : page.status === 'error' ? '✗' : '…'} {pageLabel(page)}
+                                {page.detail && ` (${page.detail})`}
+                            </li>
+                        ))}
+                    </ul>
+                )}
+
                 {selectedFile && (
                     <button
                         onClick={handleAnalyze}
@@ -74,7 +159,7 @@ function ImageUpload() {
                         style={{ marginTop: '1rem', width: '100%' }}
                         disabled={loading}
                     >
-                        {loading ? 'Analyzing...' : 'Analyze Image'}
+                        {loading ? 'Analyzing...' : isBatch ? `Analyze ${selectedFiles.length} File${selectedFiles.length > 1 ? 's' : ''}` : 'Analyze Image'}
                     </button>
                 )}
             </div>
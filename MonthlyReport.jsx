@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
+import { runExportJob } from './exportJobs';
 
 const API_BASE = `http://${window.location.hostname}:8000/api`;
 
@@ -62,22 +63,22 @@ function MonthlyReport() {
 
     const downloadExcel = async () => {
         try {
-            const response = await axios.get(`${API_BASE}/reports/monthly/export?year_month=${month}`, {
-                responseType: 'blob',
-            });
-            const url = window.URL.createObjectURL(new Blob([response.data]));
-            const link = document.createElement('a');
-            link.href = url;
-            link.setAttribute('download', `monthly_report_${month}.xlsx`);
-            document.body.appendChild(link);
-            link.click();
-            link.remove();
+            await runExportJob({ kind: 'monthly', year_month: month });
         } catch (error) {
             console.error('Monthly export failed:', error);
             alert('Monthly Excel export failed.');
         }
     };
 
+    const downloadStaffStatement = async () => {
+        try {
+            await runExportJob({ kind: 'staff_monthly', year_month: month });
+        } catch (error) {
+            console.error('Staff statement export failed:', error);
+            alert('Staff statement export failed.');
+        }
+    };
+
     const MonthlyTable = ({ title, data = {}, types = [], highlightColor = 'var(--primary-color)' }) => {
         // Defensive data handling
         const safeData = data || {};
@@ -196,6 +197,7 @@ function MonthlyReport() {
                         {isLocked ? '✅ 確定済み (解除)' : '🔒 月締め確定'}
                     </button>
                     <button onClick={downloadExcel} className="btn outline">月報エクセル出力</button>
+                    <button onClick={downloadStaffStatement} className="btn outline">スタッフ別明細出力</button>
                 </div>
             </div>
 
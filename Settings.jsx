@@ -7,26 +7,18 @@ function Settings() {
     const [restoring, setRestoring] = useState(false);
     const [selectedFile, setSelectedFile] = useState(null);
 
-    const handleExport = async () => {
-        try {
-            const response = await axios.get(`${API_BASE}/admin/export`);
-            const data = response.data;
-            const blob = new Blob([JSON.stringify(data, null, 2)], { type: 'application/json' });
-            const url = URL.createObjectURL(blob);
-            const link = document.createElement('a');
-            link.href = url;
-            link.download = `cleaning_data_backup_${new Date().toISOString().split('T')[0]}.json`;
-            document.body.appendChild(link);
-            link.click();
-            document.body.removeChild(link);
-        } catch (err) {
-            alert('Export failed.');
-        }
+    const handleExport = () => {
+        // The server streams the backup (.ndjson.gz); let the browser download it directly
+        const link = document.createElement('a');
+        link.href = `${API_BASE}/admin/export`;
+        document.body.appendChild(link);
+        link.click();
+        document.body.removeChild(link);
     };
 
     const handleImport = async () => {
         if (!selectedFile) {
-            alert('Please select a JSON file first.');
+            alert('Please select a backup file first.');
             return;
         }
 
@@ -36,20 +28,18 @@ function Settings() {
         if (!confirm2) return;
 
         setRestoring(true);
-        const reader = new FileReader();
-        reader.onload = async (e) => {
-            try {
-                const json = JSON.parse(e.target.result);
-                await axios.post(`${API_BASE}/admin/import`, json);
-                alert('Database restored successfully! The application will now reload.');
-                window.location.reload();
-            } catch (err) {
-                alert('Restore failed: ' + err.message);
-            } finally {
-                setRestoring(false);
-            }
-        };
-        reader.readAsText(selectedFile);
+        try {
+            // Upload the file as-is; the server restores it in chunks
+            const formData = new FormData();
+            formData.append('file', selectedFile);
+            await axios.post(`${API_BASE}/admin/import`, formData);
+            alert('Database restored successfully! The application will now reload.');
+            window.location.reload();
+        } catch (err) {
+            alert('Restore failed: ' + (err.response?.data?.detail || err.message));
+        } finally {
+            setRestoring(false);
+        }
     };
 
     return (
@@ -60,19 +50,19 @@ function Settings() {
             </p>
 
             <section style={{ marginBottom: '3rem' }}>
-                <h3>1. バックアップ (JSON Export)</h3>
-                <p>これまでの全履歴（スタッフ・部屋・清掃記録）をJSONファイルとしてダウンロードします。</p>
+                <h3>1. バックアップ (Export)</h3>
+                <p>これまでの全履歴（スタッフ・部屋・清掃記録・ロック状態）を圧縮ファイル (.ndjson.gz) としてダウンロードします。</p>
                 <button className="btn primary" onClick={handleExport}>全データのバックアップ</button>
             </section>
 
             <section style={{ padding: '2rem', border: '2px dashed rgba(255,255,255,0.1)', borderRadius: '1rem' }}>
-                <h3>2. データの復元 (JSON Import)</h3>
+                <h3>2. データの復元 (Import)</h3>
                 <p style={{ color: '#ff6b6b' }}>
                     <strong>注意:</strong> 指定したファイルの内容で現在のデータベースがすべて置き換わります。
                 </p>
                 <input
                     type="file"
-                    accept=".json"
+                    accept=".gz,.ndjson,.json"
                     onChange={(e) => setSelectedFile(e.target.files[0])}
                     style={{ marginBottom: '1rem', display: 'block' }}
                 />
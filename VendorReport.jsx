@@ -1,5 +1,6 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
+import { runExportJob } from './exportJobs';
 
 const API_BASE = `http://${window.location.hostname}:8000/api`;
 
@@ -31,16 +32,7 @@ function VendorReport() {
 
     const downloadExcel = async () => {
         try {
-            const response = await axios.get(`${API_BASE}/reports/vendor/export?date=${date}`, {
-                responseType: 'blob',
-            });
-            const url = window.URL.createObjectURL(new Blob([response.data]));
-            const link = document.createElement('a');
-            link.href = url;
-            link.setAttribute('download', `vendor_report_${date}.xlsx`);
-            document.body.appendChild(link);
-            link.click();
-            link.remove();
+            await runExportJob({ kind: 'vendor', date });
         } catch (error) {
             console.error('Export failed:', error);
             alert('Excel export failed.');
@@ -0,0 +1,309 @@
+import datetime
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+import numpy as np
+from sqlalchemy import select, func, insert
+from fastapi import HTTPException
+import models
+
+# Columnar archive of locked months.
+# archive_month() writes a locked month's cleaning_records to one file per month
+# under ARCHIVE_DIR and deletes them from the hot table in the transaction that
+# records the file in archived_months, so the table, its indexes and the SQLite
+# file only hold months that can still change. Reads go through the archive
+# transparently (scoring.fetch_records, crud.get_raw_records, range_report via
+# the daily_points rollup, which is kept), and unlocking a month moves its
+# records back into the table (restore_month).
+#
+#   pyarrow installed   <year_month>-<token>.parquet, zstd-compressed, decoded on read; the
+#                       last ARCHIVE_CACHE_MONTHS decoded months are kept in memory
+#   otherwise           <year_month>-<token>/<column>.npy, narrow dtypes, np.load(mmap_mode="r")
+#
+# Files are immutable; a re-archived month gets a new name and prune() removes
+# files no longer referenced (call after commit).
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR", "./archive")
+ARCHIVE_CACHE_MONTHS = int(os.environ.get("ARCHIVE_CACHE_MONTHS", 4))
+COLUMNS = {
+    "id": np.int64,
+    "day": np.int32,
+    "room_id": np.int32,
+    "bed_staff_id": np.int32, # 0: unassigned
+    "bath_staff_id": np.int32,
+    "towel_count": np.int16,
+    "status": np.int8, # index into STATUSES
+}
+STATUSES = ("draft", "locked")
+
+_modules = {}
+_mapped = {} # .npy path -> {column: memory map}; archives are immutable
+_decoded = OrderedDict() # .parquet path -> {column: array}, LRU
+_opened_lock = threading.Lock()
+_lock = threading.Lock() # archive / restore / prune within this process
+
+def _arrow():
+    # (pyarrow, pyarrow.parquet), or None: the .npy format is used instead
+    if "pyarrow" not in _modules:
+        try:
+            import pyarrow, pyarrow.parquet
+            _modules["pyarrow"] = (pyarrow, pyarrow.parquet)
+        except ImportError:
+            _modules["pyarrow"] = None
+    return _modules["pyarrow"]
+
+def _month_days(year_month: str):
+    try:
+        first = datetime.date.fromisoformat(f"{year_month}-01")
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Invalid month: {year_month}. Expected YYYY-MM.")
+    next_first = (first.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return first.toordinal(), next_first.toordinal()
+
+# Files
+
+def _fsync(path):
+    # Durable before the rows are deleted; directories cannot be opened on Windows
+    if os.path.isdir(path):
+        if os.name == "nt":
+            return
+        fd = os.open(path, os.O_RDONLY)
+    else:
+        fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _write(year_month, columns):
+    # -> (format, path) of a new archive holding columns
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    name = f"{year_month}-{uuid.uuid4().hex[:8]}"
+    arrow = _arrow()
+    if arrow:
+        pa, pq = arrow
+        fmt, path = "parquet", os.path.normpath(os.path.join(ARCHIVE_DIR, f"{name}.parquet"))
+        tmp = f"{path}.tmp"
+        pq.write_table(pa.table(columns), tmp, compression="zstd")
+        _fsync(tmp)
+    else:
+        fmt, path = "npy", os.path.normpath(os.path.join(ARCHIVE_DIR, name))
+        tmp = f"{path}.tmp"
+        os.makedirs(tmp)
+        for column, values in columns.items():
+            with open(os.path.join(tmp, f"{column}.npy"), "wb") as f:
+                np.save(f, values)
+                f.flush()
+                os.fsync(f.fileno())
+        _fsync(tmp)
+    os.replace(tmp, path)
+    _fsync(ARCHIVE_DIR)
+    return fmt, path
+
+def _read(fmt, path):
+    # {column: array}: memory maps of a .npy archive, decoded columns of a parquet one
+    with _opened_lock:
+        columns = _mapped.get(path) or _decoded.get(path)
+        if columns is not None:
+            if path in _decoded:
+                _decoded.move_to_end(path)
+            return columns
+    if fmt == "parquet":
+        arrow = _arrow()
+        if arrow is None:
+            raise RuntimeError(f"{path} needs pyarrow")
+        table = arrow[1].read_table(path, memory_map=True)
+        columns = {c: table.column(c).to_numpy() for c in COLUMNS}
+        with _opened_lock:
+            _decoded[path] = columns
+            while len(_decoded) > ARCHIVE_CACHE_MONTHS:
+                _decoded.popitem(last=False)
+    else:
+        columns = {c: np.load(os.path.join(path, f"{c}.npy"), mmap_mode="r") for c in COLUMNS}
+        with _opened_lock:
+            _mapped[path] = columns
+    return columns
+
+def _forget(path):
+    with _opened_lock:
+        _mapped.pop(path, None)
+        _decoded.pop(path, None)
+
+def _remove(path):
+    _forget(path)
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+    except OSError:
+        pass # still mapped (Windows): the next prune() retries
+
+# Reads
+
+def entries(db, start_day=None, end_day=None):
+    # Archived months overlapping [start_day, end_day) (all without bounds), by date.
+    # Works on a Session or a Connection.
+    A = models.ArchivedMonth
+    query = select(A.year_month, A.start_day, A.end_day, A.format, A.path, A.rows)
+    if start_day is not None:
+        query = query.where(A.start_day < end_day, A.end_day > start_day)
+    return db.execute(query.order_by(A.start_day)).all()
+
+def read_records(db, start_day=None, end_day=None):
+    # Archived records in [start_day, end_day) as an int64 array of
+    # (id, day, room_id, bed_staff_id, bath_staff_id, towel_count) rows ordered by id,
+    # or None when no archived month overlaps the range
+    found = entries(db, start_day, end_day)
+    if not found:
+        return None
+    parts = []
+    for entry in found:
+        columns = _read(entry.format, entry.path)
+        day = columns["day"]
+        keep = slice(None) if start_day is None else (day >= start_day) & (day < end_day)
+        parts.append(np.stack([np.asarray(columns[c][keep], dtype=np.int64)
+                               for c in ("id", "day", "room_id", "bed_staff_id", "bath_staff_id", "towel_count")], axis=1))
+    rows = np.concatenate(parts)
+    return rows[np.argsort(rows[:, 0], kind="stable")]
+
+def _record_dicts(columns, keep=slice(None)):
+    # Archived rows in the shape of cleaning_records (0 staff ids back to NULL)
+    out = []
+    values = [np.asarray(columns[c][keep]).tolist() for c in COLUMNS]
+    for rec_id, day, room_id, bed, bath, towel, status in zip(*values):
+        out.append({
+            "id": rec_id,
+            "date": datetime.date.fromordinal(day).isoformat(),
+            "day": day,
+            "room_id": room_id,
+            "bed_staff_id": bed or None,
+            "bath_staff_id": bath or None,
+            "towel_count": towel,
+            "status": STATUSES[status],
+        })
+    return out
+
+def raw_records(db, day: int):
+    # Records of one archived day like crud.get_raw_records returns them, or None when its month is not archived
+    found = entries(db, day, day + 1)
+    if not found:
+        return None
+    columns = _read(found[0].format, found[0].path)
+    return _record_dicts(columns, np.asarray(columns["day"]) == day)
+
+def _taken_ids(db, ids):
+    # Archived ids that a row of cleaning_records holds. Empty unless the month was
+    # archived on SQLite before cleaning_records became AUTOINCREMENT (migration 5).
+    if not len(ids):
+        return set()
+    R = models.CleaningRecord
+    hot = db.execute(select(R.id).where(R.id >= int(ids.min()), R.id <= int(ids.max()))).scalars()
+    return set(hot) & set(ids.tolist())
+
+def iter_backup_rows(conn, column_names):
+    # Archived records for backup.iter_backup, as lists in column_names order, with
+    # their ids (a taken one is left NULL, only possible on SQLite: it assigns a new one)
+    for entry in entries(conn):
+        columns = _read(entry.format, entry.path)
+        rows = _record_dicts(columns)
+        taken = _taken_ids(conn, np.asarray(columns["id"]))
+        for row in rows:
+            if row["id"] in taken:
+                row["id"] = None
+        yield [[r[c] for c in column_names] for r in rows]
+
+# Archive stage
+
+def archive_month(db, year_month: str):
+    # Locked month -> archive file; its rows leave cleaning_records. None when already archived or empty.
+    start_day, end_day = _month_days(year_month)
+    R = models.CleaningRecord
+    with _lock:
+        if db.get(models.ArchivedMonth, year_month) is not None:
+            return None
+        lock = db.query(models.MonthlyLock).filter(models.MonthlyLock.year_month == year_month).first()
+        if not lock or lock.is_locked != 1:
+            raise HTTPException(status_code=409, detail=f"Month {year_month} is not locked")
+        rows = db.execute(
+            select(R.id, R.day, R.room_id, func.coalesce(R.bed_staff_id, 0), func.coalesce(R.bath_staff_id, 0),
+                   func.coalesce(R.towel_count, 0), R.status)
+            .where(R.day >= start_day, R.day < end_day)
+            .order_by(R.id)
+        ).all()
+        if not rows:
+            db.rollback()
+            return None
+        values = list(zip(*rows))
+        columns = {
+            name: np.array(values[i] if name != "status" else [STATUSES.index(s) if s in STATUSES else 0 for s in values[i]],
+                           dtype=dtype)
+            for i, (name, dtype) in enumerate(COLUMNS.items())
+        }
+        fmt, path = _write(year_month, columns)
+        try:
+            deleted = db.query(R).filter(R.day >= start_day, R.day < end_day).delete(synchronize_session=False)
+            # The delete holds the write lock: the lock and row count cannot change under us any more
+            db.refresh(lock)
+            if lock.is_locked != 1 or deleted != len(rows):
+                raise HTTPException(status_code=409, detail=f"Month {year_month} changed while archiving")
+            db.add(models.ArchivedMonth(
+                year_month=year_month, start_day=start_day, end_day=end_day, format=fmt, path=path,
+                rows=len(rows), created_at=datetime.datetime.now().isoformat(timespec="seconds"),
+            ))
+            db.commit()
+        except Exception:
+            db.rollback()
+            _remove(path)
+            raise
+        return {"year_month": year_month, "rows": len(rows), "format": fmt}
+
+def archive_locked_months(db):
+    # The archive stage: every locked month that still has rows in cleaning_records
+    archived = {e.year_month for e in entries(db)}
+    months = [
+        m for (m,) in db.query(models.MonthlyLock.year_month).filter(models.MonthlyLock.is_locked == 1)
+        .order_by(models.MonthlyLock.year_month).all()
+        if m not in archived
+    ]
+    done = []
+    for year_month in months:
+        result = archive_month(db, year_month)
+        if result:
+            done.append(result)
+    return done
+
+def restore_month(db, year_month: str):
+    # Archived rows back into cleaning_records with their ids, e.g. when the month is
+    # unlocked. Does not commit; the file is removed by prune() after the commit.
+    entry = db.get(models.ArchivedMonth, year_month)
+    if entry is None:
+        return 0
+    columns = _read(entry.format, entry.path)
+    rows = _record_dicts(columns)
+    taken = _taken_ids(db, np.asarray(columns["id"]))
+    kept = [row for row in rows if row["id"] not in taken]
+    if kept:
+        db.execute(insert(models.CleaningRecord), kept)
+    if taken:
+        renumbered = [{k: v for k, v in row.items() if k != "id"} for row in rows if row["id"] in taken]
+        db.execute(insert(models.CleaningRecord), renumbered)
+    db.delete(entry)
+    _forget(entry.path)
+    return len(rows)
+
+def prune(db):
+    # Remove archive files no longer referenced by archived_months (call after commit)
+    if not os.path.isdir(ARCHIVE_DIR):
+        return 0
+    with _lock:
+        live = {e.path for e in entries(db)}
+        removed = 0
+        for name in os.listdir(ARCHIVE_DIR):
+            path = os.path.normpath(os.path.join(ARCHIVE_DIR, name))
+            if path not in live:
+                _remove(path)
+                removed += 1
+        return removed
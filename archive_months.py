@@ -0,0 +1,23 @@
+import sys
+import models, database, archive
+
+def run(months):
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        if months:
+            done = [r for r in (archive.archive_month(db, m) for m in months) if r]
+        else:
+            print("Archiving locked months...")
+            done = archive.archive_locked_months(db)
+        for r in done:
+            print(f"{r['year_month']}: {r['rows']} records -> {r['format']}")
+        print(f"Archived {len(done)} months.")
+    except Exception as e:
+        print(f"Error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    run(sys.argv[1:])
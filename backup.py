@@ -0,0 +1,225 @@
+import datetime
+import gzip
+import io
+import itertools
+import json
+import zlib
+from sqlalchemy import select, func, text
+from fastapi import HTTPException
+import models, crud, database, master_data, migrations, snapshots, archive
+
+# Streaming backup / restore for /api/admin.
+#
+# Format: NDJSON, optionally gzip-compressed (.ndjson.gz)
+#   {"format": "cleaning-app-backup", "version": 1, "schema_version": 4, "created_at": ..., "counts": {table: n}}
+#   {"table": "staff", "columns": ["id", "name"]}
+#   [1, "ラマ"]
+#   ...                                   (one section per table, rows as arrays)
+#   {"end": true}
+#
+# Restore reads the file in chunks, bulk-inserts each table into a staging
+# table and swaps every table in one transaction, so a bad file changes nothing.
+# Derived tables (daily_points, data_versions, report_snapshots) are rebuilt.
+# Archived months (archive.py) are part of cleaning_records in the file; a
+# restore puts them back in the table, to be archived again by the archive stage.
+
+FORMAT = "cleaning-app-backup"
+FORMAT_VERSION = 1
+CHUNK_ROWS = 1000
+GZIP_LEVEL = 6
+
+BACKUP_MODELS = [models.Staff, models.Room, models.CleaningRecord, models.DailyLock, models.MonthlyLock]
+TABLES = {m.__tablename__: m.__table__ for m in BACKUP_MODELS}
+LEGACY_KEYS = {"staff": "staff", "rooms": "rooms", "records": "cleaning_records"} # old JSON export
+
+def schema_version():
+    return max(version for version, _, _ in migrations.MIGRATIONS)
+
+def _line(obj):
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+def _read_transaction(conn):
+    # pysqlite only opens a transaction before DML; start one so the counts
+    # and every table are read from the same snapshot
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN")
+    else:
+        conn.execution_options(isolation_level="REPEATABLE READ")
+
+def iter_backup(compress: bool = True):
+    # Opens its own connection: the response is streamed after the request scope ends
+    gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+    out = []
+
+    def emit(data):
+        out.append(gz.compress(data) if gz else data)
+
+    with database.engine.connect() as conn:
+        _read_transaction(conn)
+        counts = {name: conn.execute(select(func.count()).select_from(table)).scalar() for name, table in TABLES.items()}
+        counts["cleaning_records"] += sum(e.rows for e in archive.entries(conn))
+        emit(_line({
+            "format": FORMAT,
+            "version": FORMAT_VERSION,
+            "schema_version": schema_version(),
+            "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "counts": counts,
+        }))
+        for name, table in TABLES.items():
+            columns = [c.name for c in table.columns]
+            emit(_line({"table": name, "columns": columns}))
+            result = conn.execute(
+                select(table).order_by(*table.primary_key.columns),
+                execution_options={"stream_results": True, "yield_per": CHUNK_ROWS},
+            )
+            partitions = result.partitions()
+            if name == "cleaning_records":
+                partitions = itertools.chain(partitions, archive.iter_backup_rows(conn, columns))
+            for rows in partitions:
+                emit(b"".join(_line(list(row)) for row in rows))
+                yield b"".join(out)
+                out.clear()
+        emit(_line({"end": True}))
+        if gz:
+            out.append(gz.flush())
+        yield b"".join(out)
+
+# Restore
+
+def _open_text(fileobj):
+    head = fileobj.read(2)
+    fileobj.seek(0)
+    if head == b"\x1f\x8b":
+        fileobj = gzip.GzipFile(fileobj=fileobj, mode="rb")
+    return io.TextIOWrapper(fileobj, encoding="utf-8")
+
+def _bad(msg):
+    return HTTPException(status_code=400, detail=f"Invalid backup: {msg}")
+
+def _iter_sections(stream):
+    # Yields (table, columns, counts, row iterator) per section, in file order
+    first = stream.readline()
+    try:
+        header = json.loads(first)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        # Legacy single-document JSON export ({"staff": [...], "rooms": [...], "records": [...]})
+        stream.seek(0)
+        try:
+            data = json.load(stream)
+        except ValueError:
+            raise _bad("not a backup file")
+        if not isinstance(data, dict):
+            raise _bad("not a backup file")
+        for key, name in LEGACY_KEYS.items():
+            rows = data.get(key, [])
+            for r in rows:
+                r.pop("_sa_instance_state", None)
+            columns = sorted({k for r in rows for k in r})
+            yield name, columns, None, ([r.get(c) for c in columns] for r in rows)
+        return
+
+    if header.get("version", 0) > FORMAT_VERSION:
+        raise _bad(f"format version {header.get('version')} is newer than this server")
+    if header.get("schema_version", 0) > schema_version():
+        raise _bad(f"schema version {header.get('schema_version')} is newer than this server")
+    counts = header.get("counts", {})
+
+    pending = None
+    while True:
+        line = pending if pending is not None else stream.readline()
+        pending = None
+        if not line:
+            raise _bad("truncated file (no end marker)")
+        obj = json.loads(line)
+        if isinstance(obj, dict) and obj.get("end"):
+            return
+        if not isinstance(obj, dict) or "table" not in obj:
+            raise _bad("expected a table section")
+
+        def rows():
+            nonlocal pending
+            for row_line in stream:
+                row = json.loads(row_line)
+                if not isinstance(row, list):
+                    pending = row_line
+                    return
+                yield row
+        yield obj["table"], obj["columns"], counts.get(obj["table"]), rows()
+        if pending is None:
+            raise _bad("truncated file (no end marker)")
+
+def _staging_name(name):
+    return f"staging_{name}"
+
+def _prepare_row(name, table, columns, row, defaults):
+    values = dict(zip(columns, row))
+    record = {c.name: values.get(c.name, defaults.get(c.name)) for c in table.columns}
+    if name == "cleaning_records" and record.get("day") is None:
+        # Older backups have no `day` column
+        try:
+            record["day"] = crud.day_number(record.get("date"))
+        except (TypeError, ValueError):
+            record["day"] = None
+    return record
+
+def restore_backup(db, fileobj):
+    conn = db.connection()
+    try:
+        for name in TABLES:
+            conn.execute(text(f"DROP TABLE IF EXISTS {_staging_name(name)}"))
+            conn.execute(text(f"CREATE TEMP TABLE {_staging_name(name)} AS SELECT * FROM {name} WHERE 1 = 0"))
+
+        seen = {}
+        for name, columns, expected, rows in _iter_sections(_open_text(fileobj)):
+            table = TABLES.get(name)
+            if table is None:
+                for _ in rows:
+                    pass # tables this server does not know about
+                continue
+            staging = text(f"INSERT INTO {_staging_name(name)} ({', '.join(c.name for c in table.columns)}) "
+                           f"VALUES ({', '.join(':' + c.name for c in table.columns)})")
+            defaults = {c.name: c.default.arg for c in table.columns
+                        if c.name not in columns and c.default is not None and c.default.is_scalar}
+            count = 0
+            chunk = []
+            for row in rows:
+                chunk.append(_prepare_row(name, table, columns, row, defaults))
+                if len(chunk) >= CHUNK_ROWS:
+                    conn.execute(staging, chunk)
+                    count += len(chunk)
+                    chunk = []
+            if chunk:
+                conn.execute(staging, chunk)
+                count += len(chunk)
+            if expected is not None and expected != count:
+                raise _bad(f"{name} has {count} rows, header says {expected}")
+            seen[name] = count
+
+        # Swap: every table present in the file is replaced from its staging copy
+        # in this transaction (legacy JSON exports leave the lock tables alone)
+        for name in reversed(list(TABLES)):
+            if name in seen:
+                conn.execute(text(f"DELETE FROM {name}"))
+        for name, table in TABLES.items():
+            if name in seen:
+                cols = ", ".join(c.name for c in table.columns)
+                conn.execute(text(f"INSERT INTO {name} ({cols}) SELECT {cols} FROM {_staging_name(name)}"))
+            conn.execute(text(f"DROP TABLE {_staging_name(name)}"))
+
+        # Rebuild derived data on the restored tables; every record is in the table again
+        db.query(models.ArchivedMonth).delete()
+        master_data.invalidate()
+        crud.bump_data_versions(db, ["master"])
+        crud.rebuild_daily_points(db, commit=False)
+        crud.recapture_locked_snapshots(db)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        master_data.invalidate()
+    snapshots.prune(db)
+    archive.prune(db)
+    return seen
@@ -0,0 +1,240 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+import models, schemas, crud, database, migrations, excel_export, cube
+
+# Report benchmark over synthetic data.
+# A seeded generator fills a temp SQLite DB with the real room layout (crud.seed_data)
+# and daily records starting 2024-01-01. The DB grows through the configured sizes
+# (years of data) and the hot paths are timed at each size:
+#   daily           crud.get_daily_report, last day
+#   vendor_day      crud.get_vendor_report, last day
+#   vendor_range    crud.get_vendor_report, last full month as a date range
+#   monthly         crud.get_monthly_report, last full month
+#   save_day        crud.create_cleaning_records, overwrite of one day
+#   vendor_export   vendor workbook (last month range) rendered and streamed
+#   monthly_export  monthly workbook rendered and streamed
+#   *_warm          daily / vendor_day / vendor_range / monthly served from the cached month cube
+#
+# The other reads start from an empty cube cache (cold), as the first request after a write does.
+#   python bench_reports.py                          # 0.25, 1 and 3 years, table + JSON on stdout
+#   python bench_reports.py --years 1 5 --out run.json
+#   python bench_reports.py --compare baseline.json  # exit 1 when a median is >20% slower
+#
+# Same seed and sizes give the same data, so result files of two commits compare directly.
+
+START = datetime.date(2024, 1, 1)
+DEFAULT_YEARS = [0.25, 1, 3]
+REPEAT = 5
+SEED = 42
+OCCUPANCY = 0.85 # share of rooms cleaned on a day
+TOWEL_RATE = 0.05
+REGRESSION = 1.2 # --compare threshold (median ratio)
+
+# Generator
+
+def open_db(path):
+    engine = database.make_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    migrations.run_migrations(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        crud.seed_data(db)
+    return engine, Session
+
+def day_rows(rnd, rooms, staff, date):
+    # One day of records as crud stores them (room_id, staff ids, towel, day)
+    day = date.toordinal()
+    iso = date.isoformat()
+    rows = []
+    for room_id in rooms:
+        if rnd.random() >= OCCUPANCY:
+            continue
+        bed = rnd.choice(staff)
+        rows.append({
+            "date": iso, "day": day, "room_id": room_id,
+            "bed_staff_id": bed,
+            "bath_staff_id": bed if rnd.random() < 0.3 else rnd.choice(staff),
+            "towel_count": 1 if rnd.random() < TOWEL_RATE else 0,
+            "status": "draft",
+        })
+    return rows
+
+def fill(Session, rnd, first, last):
+    # Bulk-load [first, last] and rebuild the rollup once; far faster than a save per day
+    with Session() as db:
+        rooms = [r.id for r in crud.get_rooms(db)]
+        staff = [s.id for s in crud.get_staff(db)]
+        date = first
+        batch = []
+        while date <= last:
+            batch.extend(day_rows(rnd, rooms, staff, date))
+            if len(batch) >= 20000:
+                db.execute(insert(models.CleaningRecord), batch)
+                batch = []
+            date += datetime.timedelta(days=1)
+        if batch:
+            db.execute(insert(models.CleaningRecord), batch)
+        crud.rebuild_daily_points(db, commit=False)
+        db.commit()
+        return db.query(models.CleaningRecord).count()
+
+# Timings
+
+def timed(fn, repeat):
+    fn() # warm-up: master cache, statement cache, page cache
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    samples.sort()
+    return {
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+    }
+
+def drain(wb):
+    size = 0
+    for chunk in excel_export.stream_workbook(wb):
+        size += len(chunk)
+    return size
+
+def bench_size(Session, rnd, last, repeat):
+    last_month_end = last.replace(day=1) - datetime.timedelta(days=1)
+    month_start = last_month_end.replace(day=1)
+    year_month = month_start.isoformat()[:7]
+    day = last.isoformat()
+    with Session() as db:
+        rooms = [r.id for r in crud.get_rooms(db)]
+        staff = [s.id for s in crud.get_staff(db)]
+        save_rows = [
+            schemas.CleaningRecordCreate(**{k: v for k, v in row.items() if k != "day"})
+            for row in day_rows(rnd, rooms, staff, last)
+        ]
+
+        def run(fn, cold=True):
+            def call():
+                if cold:
+                    cube._cache.clear()
+                fn()
+                db.rollback() # end the read transaction like a request would
+            return call
+
+        reads = {
+            "daily": lambda: crud.get_daily_report(db, day),
+            "vendor_day": lambda: crud.get_vendor_report(db, day),
+            "vendor_range": lambda: crud.get_vendor_report(db, month_start.isoformat(), last_month_end.isoformat()),
+            "monthly": lambda: crud.get_monthly_report(db, year_month),
+        }
+        timings = {name: timed(run(fn), repeat) for name, fn in reads.items()}
+        timings.update({f"{name}_warm": timed(run(fn, cold=False), repeat) for name, fn in reads.items()})
+        return {
+            **timings,
+            "save_day": timed(lambda: crud.create_cleaning_records(db, save_rows, day), repeat),
+            "vendor_export": timed(run(lambda: drain(excel_export.vendor_workbook(
+                crud.get_vendor_report(db, month_start.isoformat(), last_month_end.isoformat())))), repeat),
+            "monthly_export": timed(run(lambda: drain(excel_export.monthly_workbook(
+                crud.get_monthly_report(db, year_month)))), repeat),
+        }
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+def run(years, repeat, seed):
+    work = tempfile.mkdtemp()
+    results = {"env": environment(), "seed": seed, "repeat": repeat, "sizes": []}
+    try:
+        engine, Session = open_db(os.path.join(work, "bench.db"))
+        rnd = random.Random(seed)
+        filled_to = START - datetime.timedelta(days=1)
+        for size in sorted(years):
+            last = START + datetime.timedelta(days=max(1, round(size * 365)) - 1)
+            t0 = time.perf_counter()
+            records = fill(Session, rnd, filled_to + datetime.timedelta(days=1), last)
+            load_s = time.perf_counter() - t0
+            filled_to = last
+            timings = bench_size(Session, random.Random(seed + 1), last, repeat)
+            results["sizes"].append({
+                "years": size, "days": (last - START).days + 1, "records": records,
+                "load_s": round(load_s, 2), "timings": timings,
+            })
+            print_size(results["sizes"][-1])
+        engine.dispose()
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    return results
+
+# Output
+
+def print_size(entry):
+    print(f"\n{entry['years']} years, {entry['records']} records (loaded in {entry['load_s']}s)", file=sys.stderr)
+    print(f"{'operation':>18} {'min ms':>9} {'median ms':>10} {'p95 ms':>9}", file=sys.stderr)
+    for name, t in entry["timings"].items():
+        print(f"{name:>18} {t['min_ms']:>9.1f} {t['median_ms']:>10.1f} {t['p95_ms']:>9.1f}", file=sys.stderr)
+
+def compare(results, baseline_path):
+    # Median of every (size, operation) against the baseline file; -> list of regressions
+    with open(baseline_path) as f:
+        baseline = {entry["years"]: entry["timings"] for entry in json.load(f)["sizes"]}
+    regressions = []
+    print(f"\n{'years':>6} {'operation':>18} {'baseline':>9} {'now':>9} {'ratio':>6}", file=sys.stderr)
+    for entry in results["sizes"]:
+        old = baseline.get(entry["years"])
+        if old is None:
+            continue
+        for name, t in entry["timings"].items():
+            if name not in old or not old[name]["median_ms"]:
+                continue
+            ratio = t["median_ms"] / old[name]["median_ms"]
+            flag = " <-" if ratio > REGRESSION else ""
+            print(f"{entry['years']:>6} {name:>18} {old[name]['median_ms']:>9.1f} {t['median_ms']:>9.1f} {ratio:>6.2f}{flag}", file=sys.stderr)
+            if ratio > REGRESSION:
+                regressions.append({"years": entry["years"], "operation": name, "ratio": round(ratio, 2)})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark report hot paths over synthetic data.")
+    parser.add_argument("--years", type=float, nargs="+", default=DEFAULT_YEARS, help="data sizes in years")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    parser.add_argument("--compare", help="baseline JSON from an earlier run")
+    args = parser.parse_args()
+
+    results = run(args.years, args.repeat, args.seed)
+    if args.compare:
+        results["regressions"] = compare(results, args.compare)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if results.get("regressions"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from sqlalchemy.orm import sessionmaker
+import models, schemas, crud, database, migrations
+
+# Concurrent read/write throughput of the SQLite storage settings.
+# "before" reproduces the old defaults (rollback journal, synchronous=FULL,
+# default cache, no mmap); "after" uses the settings from database.py.
+# Writers save full days like FastEntry tablets, readers load vendor/monthly reports.
+
+WRITERS = 3
+READERS = 6
+DURATION = 5.0 # seconds per configuration
+DAYS = 30
+
+CONFIGS = [
+    ("before", {"journal_mode": "DELETE", "synchronous": "FULL", "cache_size": -2000, "mmap_size": 0}),
+    ("after", {}),
+]
+
+def setup(path, pragmas):
+    engine = database.make_engine(f"sqlite:///{path}", pragmas=pragmas)
+    models.Base.metadata.create_all(bind=engine)
+    migrations.run_migrations(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    with Session() as db:
+        crud.seed_data(db)
+        rooms = [r.id for r in crud.get_rooms(db)]
+        staff = [s.id for s in crud.get_staff(db)]
+    return engine, Session, rooms, staff
+
+def day_records(rnd, rooms, staff, date):
+    return [
+        schemas.CleaningRecordCreate(
+            date=date, room_id=room_id,
+            bed_staff_id=rnd.choice(staff), bath_staff_id=rnd.choice(staff),
+            towel_count=1 if rnd.random() < 0.05 else 0,
+        )
+        for room_id in rooms
+    ]
+
+def dates():
+    return [f"2025-03-{d:02d}" for d in range(1, DAYS + 1)]
+
+def run_config(name, pragmas):
+    work = tempfile.mkdtemp()
+    try:
+        engine, Session, rooms, staff = setup(os.path.join(work, "bench.db"), pragmas)
+        rnd = random.Random(1)
+        with Session() as db:
+            for date in dates():
+                crud.create_cleaning_records(db, day_records(rnd, rooms, staff, date), date)
+
+        stop = time.perf_counter() + DURATION
+        stats = {"write": [], "read": [], "errors": 0}
+        stats_lock = threading.Lock()
+
+        def worker(kind, seed):
+            rnd = random.Random(seed)
+            with Session() as db:
+                while time.perf_counter() < stop:
+                    date = rnd.choice(dates())
+                    t0 = time.perf_counter()
+                    try:
+                        if kind == "write":
+                            crud.create_cleaning_records(db, day_records(rnd, rooms, staff, date), date)
+                        elif rnd.random() < 0.5:
+                            crud.get_vendor_report(db, date)
+                        else:
+                            crud.get_monthly_report(db, "2025-03")
+                        db.rollback() # end the read transaction like a request would
+                    except Exception:
+                        db.rollback()
+                        with stats_lock:
+                            stats["errors"] += 1
+                        continue
+                    with stats_lock:
+                        stats[kind].append(time.perf_counter() - t0)
+
+        threads = [threading.Thread(target=worker, args=("write", i)) for i in range(WRITERS)]
+        threads += [threading.Thread(target=worker, args=("read", 100 + i)) for i in range(READERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        engine.dispose()
+        return stats
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+def p95(values):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[int(len(values) * 0.95) - 1 if len(values) > 1 else 0]
+
+def run():
+    print(f"{WRITERS} writers, {READERS} readers, {DURATION:.0f}s per configuration")
+    print(f"{'config':>8} {'writes/s':>9} {'reads/s':>8} {'write p95 ms':>13} {'read p95 ms':>12} {'errors':>7}")
+    for name, pragmas in CONFIGS:
+        stats = run_config(name, pragmas)
+        print(f"{name:>8} {len(stats['write']) / DURATION:>9.1f} {len(stats['read']) / DURATION:>8.1f} "
+              f"{p95(stats['write']) * 1000:>13.1f} {p95(stats['read']) * 1000:>12.1f} {stats['errors']:>7}")
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,51 @@
+import random
+import time
+import master_data, scoring
+
+# Vendor report scaling check (no DB needed): builds synthetic record frames
+# over the real 7F-12F layout and times scoring.vendor_view.
+# Time per Bed/Bath assignment should stay flat as the input grows.
+
+SIZES = [1000, 5000, 10000, 20000, 50000] # Bed/Bath assignments
+REPEAT = 3
+
+def build_master():
+    rooms = []
+    for floor in range(7, 13):
+        for i in range(1, 29):
+            room_type = "TW" if i % 3 == 0 else "DB"
+            rooms.append(master_data.RoomRow(id=len(rooms) + 1, number=f"{floor}{i:02d}", type=room_type, floor=floor))
+    names = ["ラマ", "バビタ", "ディパ", "リタ", "リラ", "シタ", "ラメス", "スニム", "ヒマル", "自社"]
+    staff = [master_data.StaffRow(id=i + 1, name=n) for i, n in enumerate(names)]
+    return master_data.MasterData(0, None, rooms, staff)
+
+def build_frame(layout, master, n_assignments, rnd):
+    start_day = 740000
+    rows = []
+    day = start_day
+    while len(rows) * 2 < n_assignments:
+        for room in master.rooms:
+            towel = 1 if rnd.random() < 0.05 else 0
+            rows.append((day, room.id, rnd.choice(master.staff).id, rnd.choice(master.staff).id, towel))
+        day += 1
+    rows = rows[:n_assignments // 2]
+    return scoring.RecordFrame(layout, start_day, day + 1, rows)
+
+def run():
+    rnd = random.Random(42)
+    master = build_master()
+    layout = scoring.Layout(master)
+
+    print(f"{'assignments':>12} {'records':>8} {'total ms':>10} {'us/assignment':>14}")
+    for size in SIZES:
+        frame = build_frame(layout, master, size, rnd)
+        best = None
+        for _ in range(REPEAT):
+            t0 = time.perf_counter()
+            scoring.vendor_view(scoring.Aggregate(frame))
+            elapsed = time.perf_counter() - t0
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{size:>12} {len(frame):>8} {best * 1000:>10.1f} {best * 1e6 / size:>14.2f}")
+
+if __name__ == "__main__":
+    run()
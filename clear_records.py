@@ -1,12 +1,20 @@
-from sqlalchemy.orm import Session
-import models, database
+import models, database, archive, crud, snapshots
 
 def clear_records():
     db = database.SessionLocal()
     try:
         print("Clearing all cleaning records...")
         num_deleted = db.query(models.CleaningRecord).delete()
+        num_deleted += sum(n or 0 for (n,) in db.query(models.ArchivedMonth.rows).all())
+        db.query(models.ArchivedMonth).delete()
+        # Derived data goes with them: the points rollup, frozen reports of locked periods,
+        # and every cached report / ETag (all of them include the master version)
+        db.query(models.DailyPoints).delete()
+        snapshots.drop(db)
+        crud.bump_data_versions(db, ["master"])
         db.commit()
+        snapshots.prune(db)
+        archive.prune(db)
         print(f"Deleted {num_deleted} records.")
     except Exception as e:
         print(f"Error: {e}")
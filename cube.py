@@ -0,0 +1,170 @@
+import datetime
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from fastapi import HTTPException
+import crud, scoring
+
+# Per-month report cube.
+# One month of records is aggregated once per data version (month scope + master)
+# into scoring's dense counts[day, floor, type, staff, kind]. The daily, vendor,
+# monthly and staff statement reports are then projections of the cached month:
+# a day or a date range inside the month is a slice of it (Aggregate.days), the
+# month totals are sums over its axes. Recent months stay in a process-wide LRU.
+#
+# query() is the generic slice / rollup on top of it, in integer half-point units:
+#   dimensions  day (YYYY-MM-DD) | floor ("7", None: no floor) | type | staff | kind
+#   staff       report names (staff sharing a name are one row), D・D credited to 自社,
+#               None for unknown / unassigned staff
+#   kind        room | bed | bath | bed_dd | bath_dd | dd
+#   measure     points (Bed/Bath 0.5, D・D 1.0) | count (events)
+
+CUBE_CACHE_MONTHS = int(os.environ.get("CUBE_CACHE_MONTHS", 12))
+
+DIMENSIONS = ("day", "floor", "type", "staff", "kind")
+KINDS = ("room", "bed", "bath", "bed_dd", "bath_dd", "dd") # scoring.K_* order
+HALVES = np.array([0, 1, 1, 0, 0, 2], dtype=np.int64) # half-points per event of each kind
+MEASURES = ("points", "count")
+
+class MonthCube:
+    def __init__(self, year_month, version, agg):
+        self.year_month = year_month
+        self.version = version
+        self.agg = agg
+        layout = agg.layout
+        frame = agg.frame
+
+        # Staff codes -> report names; unknown / unassigned share the last slot
+        n_names = len(layout.names)
+        to_name = np.zeros((layout.n_staff, n_names + 1), dtype=np.int64)
+        to_name[np.arange(layout.n_known), layout.staff_name_code] = 1
+        to_name[layout.n_known:, n_names] = 1
+        counts = np.moveaxis(np.moveaxis(agg.counts, 3, -1) @ to_name, -1, 3)
+        counts[:, :, :, layout.in_house_name_code, scoring.K_DD] += counts[:, :, :, n_names, scoring.K_DD]
+        counts[:, :, :, n_names, scoring.K_DD] = 0
+
+        self.counts = counts.astype(np.int32)
+        self.halves = self.counts * HALVES.astype(np.int32)
+        self.labels = {
+            "day": [datetime.date.fromordinal(d).isoformat() for d in range(frame.start_day, frame.end_day)],
+            "floor": [str(f) for f in layout.floors] + [None],
+            "type": list(layout.types),
+            "staff": list(layout.names) + [None],
+            "kind": list(KINDS),
+        }
+
+    def days(self, start_day, end_day):
+        return self.agg.days(start_day, end_day)
+
+# Cache
+
+_cache = OrderedDict() # (database, year_month) -> MonthCube
+_cache_lock = threading.Lock()
+
+def cache_key(db, year_month: str):
+    # Sync session -> (key, version); read before the records, so a write racing
+    # the build can only make the cached cube look older than it is
+    crud.month_day_range(year_month)
+    versions = crud.get_data_versions(db, [f"month:{year_month}", "master"])
+    return (db.get_bind().url.database, year_month), tuple(v for _, v in versions)
+
+def lookup(key, version):
+    with _cache_lock:
+        found = _cache.get(key)
+        if found is None or found.version != version:
+            return None
+        _cache.move_to_end(key)
+        return found
+
+def build(key, version, layout, rows):
+    # CPU part of a cache miss, rows from scoring.fetch_records over the month
+    year_month = key[1]
+    start_day, end_day = crud.month_day_range(year_month)
+    cube = MonthCube(year_month, version, scoring.Aggregate(scoring.RecordFrame(layout, start_day, end_day, rows)))
+    with _cache_lock:
+        _cache[key] = cube
+        _cache.move_to_end(key)
+        while len(_cache) > CUBE_CACHE_MONTHS:
+            _cache.popitem(last=False)
+    return cube
+
+def get_cube(db, year_month: str):
+    # Sync path (crud, export jobs, benchmarks); render.py has the async one
+    key, version = cache_key(db, year_month)
+    cube = lookup(key, version)
+    if cube is None:
+        layout, rows = scoring.fetch_records(db, *crud.month_day_range(year_month))
+        cube = build(key, version, layout, rows)
+    return cube
+
+def month_of(start_day, end_day):
+    # "YYYY-MM" when [start_day, end_day) lies in one month, else None
+    first = datetime.date.fromordinal(start_day)
+    last = datetime.date.fromordinal(end_day - 1)
+    return first.isoformat()[:7] if (first.year, first.month) == (last.year, last.month) else None
+
+# Projections
+
+def monthly_points(cube):
+    # (day, room_type, is_vendor, points) rows as scoring.load_points reads them
+    # from the daily_points rollup, for scoring.monthly_view
+    agg = cube.agg
+    layout = agg.layout
+    c = agg.counts.sum(axis=1) # [day, type, staff, kind]
+    bed_bath = c[:, :, :, scoring.K_BED] + c[:, :, :, scoring.K_BATH]
+    vendor = np.arange(layout.n_staff) != layout.in_house_code
+    vendor_halves = (bed_bath * vendor).sum(axis=2) # [day, type]
+    in_house_halves = bed_bath.sum(axis=2) - vendor_halves
+    dd = c[:, :, :, scoring.K_DD].sum(axis=(1, 2))
+    worked = c[:, :, :, scoring.K_ROOM].sum(axis=(1, 2)) > 0
+
+    rows = []
+    for i in np.flatnonzero(worked).tolist():
+        day = agg.frame.start_day + i
+        for t, room_type in enumerate(layout.types):
+            rows.append((day, room_type, 1, vendor_halves[i, t] / 2))
+            rows.append((day, room_type, 0, in_house_halves[i, t] / 2))
+        rows.append((day, scoring.DD, 0, float(dd[i])))
+    return rows
+
+def query(cube, by=(), where=None, measure="points"):
+    # Rollup over every dimension not in `by`, after keeping only the labels in where[dim]
+    # -> {"by", "measure", "cells": [{dim: label, ..., "value"}], "total"}
+    unknown = [d for d in list(by) + list(where or {}) if d not in DIMENSIONS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown dimension: {unknown[0]}. Use {', '.join(DIMENSIONS)}")
+    if len(set(by)) != len(by):
+        raise HTTPException(status_code=400, detail="Dimensions in by must be distinct")
+    if measure not in MEASURES:
+        raise HTTPException(status_code=400, detail=f"measure must be one of {', '.join(MEASURES)}")
+
+    values = cube.halves if measure == "points" else cube.counts
+    picked = []
+    for dim in DIMENSIONS:
+        labels = cube.labels[dim]
+        wanted = (where or {}).get(dim)
+        if wanted is None:
+            picked.append(np.arange(len(labels)))
+        else:
+            wanted = set(wanted)
+            picked.append(np.array([i for i, label in enumerate(labels) if label in wanted], dtype=np.int64))
+    values = values[np.ix_(*picked)]
+
+    axes = [DIMENSIONS.index(d) for d in by]
+    rolled = values.sum(axis=tuple(i for i in range(len(DIMENSIONS)) if i not in axes), dtype=np.int64)
+    rolled = np.transpose(rolled, np.argsort(np.argsort(axes))) if axes else rolled
+
+    scale = 0.5 if measure == "points" else 1
+    cells = []
+    for index in zip(*np.nonzero(rolled)) if axes else []:
+        cell = {d: cube.labels[d][picked[a][i]] for d, a, i in zip(by, axes, index)}
+        cell["value"] = int(rolled[index]) * scale
+        cells.append(cell)
+    return {
+        "year_month": cube.year_month,
+        "by": list(by),
+        "measure": measure,
+        "cells": cells,
+        "total": int(rolled.sum()) * scale,
+    }
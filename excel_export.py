@@ -0,0 +1,145 @@
+import tempfile
+import scoring
+
+# Streaming Excel export engine.
+# Workbooks are built with openpyxl write-only mode: rows go straight to the
+# sheet's temp file, totals are accumulated while rows are written, and the
+# finished file is sent to the client in chunks from disk.
+# openpyxl is imported on the first export, not at startup.
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+CHUNK_SIZE = 64 * 1024
+
+VENDOR_TYPES = scoring.MONTHLY_TYPES + [scoring.DD]
+_header_style = None
+
+def _header_styles():
+    # (font, border, alignment) of header cells, built on first use
+    global _header_style
+    if _header_style is None:
+        from openpyxl.styles import Alignment, Border, Font, Side
+        thin = Side(style="thin")
+        _header_style = (
+            Font(bold=True),
+            Border(left=thin, right=thin, top=thin, bottom=thin),
+            Alignment(horizontal="center", vertical="top"),
+        )
+    return _header_style
+
+class Totals:
+    # Running column sums for one block of rows
+    def __init__(self, columns):
+        self.columns = columns
+        self.sums = [0.0] * len(columns)
+
+    def add(self, values):
+        for i, v in enumerate(values):
+            self.sums[i] += v
+        return values
+
+def _header(ws, columns):
+    from openpyxl.cell import WriteOnlyCell
+    font, border, alignment = _header_styles()
+    cells = []
+    for name in columns:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = font
+        cell.border = border
+        cell.alignment = alignment
+        cells.append(cell)
+    ws.append(cells)
+
+def _write_matrix(ws, title, matrix):
+    # Floor rows, a 合計 row and a spacer, same layout as the report screen
+    ws.append([f"--- {title} ---"])
+    totals = Totals(VENDOR_TYPES + ["Total"])
+    for f in scoring.REPORT_FLOORS:
+        cells = matrix.get(f, {})
+        ws.append([f"{f}F"] + totals.add([cells.get(t, 0.0) for t in totals.columns]))
+    ws.append(["合計"] + totals.sums)
+    ws.append([""])
+
+def vendor_workbook(data):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    reports = data["staff_reports"]
+
+    # 1. Summary Sheet (Sequence 1-4)
+    ws = wb.create_sheet("集計表")
+    _header(ws, ["フロア"] + VENDOR_TYPES + ["合計"])
+    for s_name, rep in reports.items():
+        _write_matrix(ws, f"作業者日報: {s_name}", rep["matrix"])
+    _write_matrix(ws, "ワールドクリーン（外注）", data["vendor_total"]["matrix"])
+    _write_matrix(ws, "ベストクリエイト（自社）", data["in_house_total"]["matrix"])
+    _write_matrix(ws, "ポートタワーホテル（全体）", data["hotel_total"]["matrix"])
+
+    # 2. Details Sheet
+    details = [(name, d) for name, rep in reports.items() for d in rep["details"]]
+    if details:
+        ws = wb.create_sheet("詳細")
+        dated = "date" in details[0][1]
+        _header(ws, (["日付"] if dated else []) + ["作業者", "部屋番号", "タイプ", "作業内容", "ポイント"])
+        for staff_name, d in details:
+            row = [d["date"]] if dated else []
+            ws.append(row + [staff_name, d["room"], d["type"], d["work"], d["points"]])
+    return wb
+
+def _write_monthly(ws, monthly_dict, types):
+    if not monthly_dict:
+        return
+    _header(ws, ["日付"] + types + ["合計"])
+    totals = Totals(types + ["Total"])
+    for day in sorted(monthly_dict.keys()):
+        stats = monthly_dict[day]
+        ws.append([day] + totals.add([stats.get(t, 0.0) for t in totals.columns]))
+    ws.append(["月間合計"] + totals.sums)
+
+def monthly_workbook(data):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    _write_monthly(wb.create_sheet("ワールドクリーン月報"), data["vendor_monthly"], scoring.MONTHLY_TYPES)
+    _write_monthly(wb.create_sheet("ホテル全体月報"), data["hotel_monthly"], VENDOR_TYPES)
+    return wb
+
+def staff_monthly_workbook(data):
+    # Payroll statement: one summary row per staff member, then points per day
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    staff = [s for s in data["staff"] if s["total_points"] or s["dd_count"]]
+
+    ws = wb.create_sheet("スタッフ別月次")
+    work = ["Full", "Bed only", "Bath only"]
+    _header(ws, ["作業者", "区分"] + data["types"] + [f"{f}F" for f in data["floors"]] + work + ["D・D件数", "合計"])
+    totals = Totals(data["types"] + data["floors"] + work + ["dd_count", "total_points"])
+    for s in staff:
+        values = ([s["by_type"][t] for t in data["types"]] + [s["by_floor"][f] for f in data["floors"]]
+                  + [s["work"][w] for w in work] + [s["dd_count"], s["total_points"]])
+        ws.append([s["name"], "外注" if s["is_vendor"] else "自社"] + totals.add(values))
+    ws.append(["合計", ""] + totals.sums)
+
+    ws = wb.create_sheet("日別ポイント")
+    _header(ws, ["日付"] + [s["name"] for s in staff] + ["合計"])
+    for i, day in enumerate(data["days"]):
+        row = [s["daily_points"][i] for s in staff]
+        ws.append([day] + row + [sum(row)])
+    ws.append(["月間合計"] + [s["total_points"] for s in staff] + [data["totals"]["hotel"]])
+    return wb
+
+def stream_workbook(wb):
+    # Save to an anonymous temp file and yield it in chunks
+    f = tempfile.TemporaryFile()
+    try:
+        wb.save(f)
+        f.seek(0)
+    except Exception:
+        f.close()
+        raise
+
+    def chunks():
+        with f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+    return chunks()
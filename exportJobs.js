@@ -0,0 +1,31 @@
+import axios from 'axios';
+
+const API_BASE = `http://${window.location.hostname}:8000/api`;
+const POLL_INTERVAL_MS = 1000;
+const MAX_WAIT_MS = 10 * 60 * 1000;
+
+// Queue an Excel export on the server, poll until it is rendered, then download it.
+// params: { kind: 'vendor', date, end_date } or { kind: 'monthly' | 'staff_monthly', year_month }
+export async function runExportJob(params) {
+    let { data: job } = await axios.post(`${API_BASE}/exports`, params);
+    const started = Date.now();
+    while (job.status === 'pending') {
+        if (Date.now() - started > MAX_WAIT_MS) {
+            throw new Error('Export timed out');
+        }
+        await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+        ({ data: job } = await axios.get(`${API_BASE}/exports/${job.id}`));
+    }
+    if (job.status !== 'done') {
+        throw new Error(job.error || 'Export failed');
+    }
+
+    // Let the browser stream the finished file straight to disk
+    const link = document.createElement('a');
+    link.href = `${API_BASE}/exports/${job.id}/download`;
+    link.setAttribute('download', job.filename);
+    document.body.appendChild(link);
+    link.click();
+    link.remove();
+    return job;
+}
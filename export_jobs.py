@@ -0,0 +1,237 @@
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException
+import models, crud, database, excel_export
+
+# Background Excel export jobs.
+# POST /api/exports records a job row and hands the rendering to a process
+# pool; the worker writes the .xlsx under EXPORT_DIR and the job row is marked
+# done/failed when it returns. Clients poll GET /api/exports/{id} and download
+# the artifact. Job rows live in the DB so any API worker can answer a poll.
+#
+# A job's key is its kind + parameters + the data versions of its scopes, so an
+# identical request is answered by the pending (or still valid finished) job.
+
+EXPORT_DIR = os.environ.get("EXPORT_DIR", "./exports")
+EXPORT_WORKERS = int(os.environ.get("EXPORT_WORKERS", 1))
+EXPORT_MAX_AGE = int(os.environ.get("EXPORT_MAX_AGE", 24 * 3600)) # seconds a finished job is kept
+
+KINDS = ("vendor", "monthly", "staff_monthly")
+
+class NoData(Exception):
+    pass
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the API process runs an event loop and DB threads, which must not be forked
+            _pool = ProcessPoolExecutor(
+                max_workers=EXPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+# Parameters
+
+def normalize(kind: str, date: str = None, end_date: str = None, year_month: str = None):
+    # -> (params, filename, scopes); raises 400 like the synchronous export endpoints
+    if kind == "vendor":
+        if not date:
+            raise HTTPException(status_code=400, detail="date is required for a vendor export")
+        crud.report_day_range(date, end_date)
+        if end_date == date:
+            end_date = None
+        params = {"date": date, "end_date": end_date}
+        filename = f"vendor_report_{date}_{end_date}.xlsx" if end_date else f"vendor_report_{date}.xlsx"
+        scopes = crud.month_scopes(date, end_date) if end_date else [f"date:{date}"]
+    elif kind in ("monthly", "staff_monthly"):
+        if not year_month:
+            raise HTTPException(status_code=400, detail=f"year_month is required for a {kind} export")
+        crud.month_day_range(year_month)
+        params = {"year_month": year_month}
+        filename = f"{kind}_report_{year_month}.xlsx"
+        scopes = [f"month:{year_month}"]
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown export kind: {kind}. Expected one of {', '.join(KINDS)}.")
+    return params, filename, scopes
+
+def job_key(db, kind, params, scopes):
+    versions = crud.get_data_versions(db, list(scopes) + ["master"])
+    return hashlib.sha1(repr((kind, sorted(params.items()), versions)).encode()).hexdigest()
+
+# Worker side (runs in the pool process)
+
+def _init_worker():
+    # Fresh connections in the child; never reuse the parent's pool
+    # (master_data's cache is checked against the persisted master version per job,
+    # so staff / rooms changed by the API process are seen by later jobs)
+    database.engine.dispose(close=False)
+
+def render_job(kind: str, params: dict, path: str):
+    db = database.SessionLocal()
+    try:
+        if kind == "vendor" and not params.get("end_date"):
+            snapshot = crud.get_report_snapshot(db, f"date:{params['date']}", "vendor", "xlsx")
+        elif kind == "monthly":
+            snapshot = crud.get_report_snapshot(db, f"month:{params['year_month']}", "monthly", "xlsx")
+        else:
+            snapshot = None
+
+        if snapshot:
+            # Locked period: copy the frozen workbook
+            wb = None
+        elif kind == "vendor":
+            data = crud.get_vendor_report(db, params["date"], params.get("end_date"))
+            if not data["staff_reports"]:
+                raise NoData("No data for this date")
+            wb = excel_export.vendor_workbook(data)
+        elif kind == "staff_monthly":
+            data = crud.get_staff_monthly_report(db, params["year_month"])
+            if not any(s["total_points"] or s["dd_count"] for s in data["staff"]):
+                raise NoData("No data for this month")
+            wb = excel_export.staff_monthly_workbook(data)
+        else:
+            data = crud.get_monthly_report(db, params["year_month"])
+            if not data["vendor_monthly"] and not data["hotel_monthly"]:
+                raise NoData("No data for this month")
+            wb = excel_export.monthly_workbook(data)
+    finally:
+        db.close()
+
+    tmp = f"{path}.tmp"
+    try:
+        if wb is None:
+            shutil.copyfile(snapshot[1], tmp)
+        else:
+            wb.save(tmp)
+        os.replace(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return os.path.getsize(path)
+
+# API side
+
+def _job_dict(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "params": json.loads(job.params),
+        "status": job.status,
+        "filename": job.filename,
+        "size": job.size,
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+        "download_url": f"/api/exports/{job.id}/download" if job.status == "done" else None,
+    }
+
+def _finish(job_id, future):
+    # Runs on the pool's management thread
+    db = database.SessionLocal()
+    try:
+        job = db.get(models.ExportJob, job_id)
+        if job is None:
+            return
+        try:
+            job.size = future.result()
+            job.status = "done"
+        except NoData as e:
+            job.status = "failed"
+            job.error = str(e)
+        except Exception as e:
+            job.status = "failed"
+            job.error = f"{type(e).__name__}: {e}"
+        job.finished_at = _now()
+        db.commit()
+    finally:
+        db.close()
+
+def submit(db, kind: str, date: str = None, end_date: str = None, year_month: str = None):
+    params, filename, scopes = normalize(kind, date, end_date, year_month)
+    key = job_key(db, kind, params, scopes)
+
+    # Dedup: same export of the same data that is pending or finished and still on disk
+    for job in db.query(models.ExportJob).filter(models.ExportJob.key == key, models.ExportJob.status != "failed").all():
+        if job.status == "pending" or os.path.exists(job.path):
+            return _job_dict(job)
+
+    job_id = uuid.uuid4().hex
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    job = models.ExportJob(
+        id=job_id, kind=kind, params=json.dumps(params), key=key, status="pending",
+        filename=filename, path=os.path.join(EXPORT_DIR, f"{job_id}.xlsx"), created_at=_now(),
+    )
+    db.add(job)
+    db.commit()
+
+    future = _get_pool().submit(render_job, kind, params, job.path)
+    future.add_done_callback(lambda f: _finish(job_id, f))
+    return _job_dict(job)
+
+def get_job(db, job_id: str):
+    job = db.get(models.ExportJob, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+def get_status(db, job_id: str):
+    return _job_dict(get_job(db, job_id))
+
+def get_artifact(db, job_id: str):
+    # (path, filename) of a finished job
+    job = get_job(db, job_id)
+    if job.status == "failed":
+        raise HTTPException(status_code=410, detail=job.error or "Export failed")
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail="Export is not ready yet")
+    if not os.path.exists(job.path):
+        raise HTTPException(status_code=410, detail="Export has expired")
+    return job.path, job.filename
+
+# Maintenance
+
+def recover(db):
+    # Jobs left pending by a previous process will never finish
+    db.query(models.ExportJob).filter(models.ExportJob.status == "pending").update(
+        {"status": "failed", "error": "Interrupted by a server restart", "finished_at": _now()}
+    )
+    db.commit()
+
+def cleanup(db, max_age: int = None):
+    # Remove finished jobs (and their files) older than max_age seconds
+    max_age = EXPORT_MAX_AGE if max_age is None else max_age
+    cutoff = (datetime.datetime.now() - datetime.timedelta(seconds=max_age)).isoformat(timespec="seconds")
+    old = db.query(models.ExportJob).filter(
+        models.ExportJob.status != "pending", models.ExportJob.finished_at < cutoff
+    ).all()
+    for job in old:
+        for path in (job.path, f"{job.path}.tmp"):
+            if os.path.exists(path):
+                os.unlink(path)
+        db.delete(job)
+    db.commit()
+    return len(old)
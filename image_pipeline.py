@@ -0,0 +1,203 @@
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+from dataclasses import dataclass
+import numpy as np
+import ocr_service
+
+
+# Upload pipeline in front of the OCR backend.
+# Photos are sniffed, EXIF-rotated, optionally cropped / rotated / deskewed,
+# downscaled so the long side is at most IMAGE_MAX_SIDE and re-encoded. The
+# normalized image is stored once under its sha256:
+#   uploads/ab/<sha256>.<ext>          normalized image (read back through mmap)
+#   uploads/src/<source key>           digest of the image a source+options produced
+# so the same photo uploaded again is neither re-processed nor re-sent.
+# Multi-page PDFs are split first (split_pdf): a scanned page yields its
+# embedded image, any other page is kept as a one-page PDF and sent as-is.
+# Pillow and pypdf are optional and imported on the first upload that needs them.
+
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "./uploads")
+IMAGE_MAX_SIDE = int(os.environ.get("IMAGE_MAX_SIDE", 2000)) # px, long side
+JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", 85))
+DESKEW_MAX_ANGLE = 5.0 # degrees searched either way
+DESKEW_STEP = 0.5
+PIPELINE_VERSION = 1 # bump when processing changes so old source keys are not reused
+
+EXTENSIONS = {"image/jpeg": "jpg", "image/png": "png", "image/gif": "gif", "image/webp": "webp", "image/heic": "heic",
+              "application/pdf": "pdf"}
+
+@dataclass(frozen=True)
+class StoredImage:
+    digest: str
+    mime_type: str
+    size: int
+    width: int | None = None
+    height: int | None = None
+    reused: bool = False # came from an earlier identical upload
+
+def parse_crop(value: str):
+    # "x,y,w,h" as fractions of the image (0-1) -> tuple, None/"" -> None
+    if not value:
+        return None
+    try:
+        x, y, w, h = (float(v) for v in value.split(","))
+    except ValueError:
+        raise ValueError("crop must be 'x,y,w,h' fractions")
+    if not (0 <= x < 1 and 0 <= y < 1 and 0 < w <= 1 - x + 1e-9 and 0 < h <= 1 - y + 1e-9):
+        raise ValueError("crop box must lie inside the image")
+    return (x, y, w, h)
+
+_modules = {}
+
+def _optional(name):
+    # Lazily imported optional dependency, None when it is not installed
+    if name not in _modules:
+        try:
+            _modules[name] = __import__(name, fromlist=["_"])
+        except ImportError:
+            _modules[name] = None
+    return _modules[name]
+
+def _pillow():
+    # (Image, ImageOps), or None without Pillow: uploads are then stored and sent as-is
+    image, image_ops = _optional("PIL.Image"), _optional("PIL.ImageOps")
+    return (image, image_ops) if image and image_ops else None
+
+# Storage
+
+def blob_path(digest: str, mime_type: str):
+    return os.path.join(UPLOAD_DIR, digest[:2], f"{digest}.{EXTENSIONS.get(mime_type, 'bin')}")
+
+def _atomic_write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+def find(digest: str):
+    # (path, mime_type) of a stored upload, or None
+    folder = os.path.join(UPLOAD_DIR, digest[:2])
+    if len(digest) != 64 or not os.path.isdir(folder):
+        return None
+    for mime_type, ext in EXTENSIONS.items():
+        path = os.path.join(folder, f"{digest}.{ext}")
+        if os.path.exists(path):
+            return path, mime_type
+    return None
+
+def open_blob(digest: str):
+    # Memory-mapped read-only view of a stored upload (bytes-like; close() when done)
+    found = find(digest)
+    if found is None:
+        return None
+    with open(found[0], "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), found[1]
+
+def _source_key(data: bytes, crop, rotate, deskew):
+    options = repr((PIPELINE_VERSION, IMAGE_MAX_SIDE, JPEG_QUALITY, crop, rotate, bool(deskew)))
+    return hashlib.sha256(hashlib.sha256(data).digest() + options.encode()).hexdigest()
+
+# Processing
+
+def split_pdf(data: bytes):
+    # One entry per page: the page's scanned image (largest embedded image) when it
+    # has one, otherwise the page as a one-page PDF. CPU-bound, call through render.run.
+    pypdf = _optional("pypdf")
+    if pypdf is None: # PDFs are sent whole, not split into pages
+        return [data]
+    try:
+        reader = pypdf.PdfReader(io.BytesIO(data))
+        pages = []
+        for page in reader.pages:
+            try:
+                images = list(page.images)
+            except Exception: # image filter pypdf cannot decode: keep the page itself
+                images = []
+            if images:
+                pages.append(max(images, key=lambda im: len(im.data)).data)
+                continue
+            writer = pypdf.PdfWriter()
+            writer.add_page(page)
+            out = io.BytesIO()
+            writer.write(out)
+            pages.append(out.getvalue())
+    except pypdf.errors.PyPdfError as e:
+        raise ocr_service.UnsupportedImage(f"Unreadable PDF: {e}")
+    return pages
+
+def _estimate_skew(img):
+    # Projection profile: text lines give the sharpest row-sum profile when level
+    ImageOps = _pillow()[1]
+    small = img.convert("L")
+    small.thumbnail((600, 600))
+    ink = ImageOps.invert(small).point(lambda v: 255 if v > 96 else 0)
+    best_angle, best_score = 0.0, -1.0
+    for angle in np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + 1e-9, DESKEW_STEP):
+        rows = np.asarray(ink.rotate(float(angle), expand=False), dtype=np.float32).sum(axis=1)
+        score = float(np.var(rows))
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+def normalize(data: bytes, crop=None, rotate: int = 0, deskew: bool = False):
+    # -> (bytes, mime_type, width, height); without Pillow the input passes through
+    mime_type = ocr_service.sniff_mime(data)
+    if mime_type is None:
+        raise ocr_service.UnsupportedImage("Unsupported image type")
+    pillow = _pillow()
+    if pillow is None or mime_type in ("image/heic", "application/pdf"):
+        return data, mime_type, None, None
+    Image, ImageOps = pillow
+
+    img = Image.open(io.BytesIO(data))
+    source_size = img.size
+    upright = img.getexif().get(0x0112, 1) == 1 # EXIF orientation
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    if crop:
+        x, y, w, h = crop
+        W, H = img.size
+        img = img.crop((round(x * W), round(y * H), round((x + w) * W), round((y + h) * H)))
+    if rotate:
+        img = img.rotate(-rotate, expand=True, fillcolor="white") # clockwise degrees
+    if deskew:
+        angle = _estimate_skew(img)
+        if angle:
+            img = img.rotate(angle, expand=True, resample=Image.BICUBIC, fillcolor="white")
+    img.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    encoded = out.getvalue()
+    untouched = upright and not (crop or rotate or deskew) and img.size == source_size
+    if untouched and len(encoded) >= len(data) and mime_type in ("image/jpeg", "image/png"):
+        # Already small enough: re-encoding would only cost quality
+        return data, mime_type, img.size[0], img.size[1]
+    return encoded, "image/jpeg", img.size[0], img.size[1]
+
+def ingest(data: bytes, crop=None, rotate: int = 0, deskew: bool = False) -> StoredImage:
+    # Normalize + store; CPU-bound, call through render.run from async code
+    source = os.path.join(UPLOAD_DIR, "src", _source_key(data, crop, rotate, deskew))
+    if os.path.exists(source):
+        with open(source) as f:
+            digest = f.read().strip()
+        found = find(digest)
+        if found:
+            return StoredImage(digest, found[1], os.path.getsize(found[0]), reused=True)
+
+    encoded, mime_type, width, height = normalize(data, crop, rotate, deskew)
+    digest = hashlib.sha256(encoded).hexdigest()
+    path = blob_path(digest, mime_type)
+    if not os.path.exists(path):
+        _atomic_write(path, encoded)
+    _atomic_write(source, digest.encode())
+    return StoredImage(digest, mime_type, len(encoded), width, height)
@@ -1,15 +1,34 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
-from fastapi.responses import StreamingResponse
+import time
+_import_started = time.perf_counter() # startup timing, reported once the app is ready
+
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, Request, Response
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
-import io
-import pandas as pd
+from collections import OrderedDict
+import asyncio
+import datetime
+import hashlib
+import json
+import logging
+import threading
 import os
+import weakref
 import uvicorn
-import models, schemas, crud, database
+import schemas, crud, database, migrations, excel_export, backup, render, export_jobs, ocr_service, image_pipeline, ocr_resolver, metrics, range_report, cube, archive
 
-models.Base.metadata.create_all(bind=database.engine)
+# Fast startup: schema creation / migrations / seeding only run when the versions stored
+# in app_state differ from this code. STARTUP_MODE=full forces them on every boot.
+STARTUP_MODE = os.environ.get("STARTUP_MODE", "fast")
+_startup_log = logging.getLogger("uvicorn.error")
+_startup_times = {"imports": time.perf_counter() - _import_started}
+_schema_started = time.perf_counter()
+_schema_updated = migrations.ensure_schema(database.engine, force=STARTUP_MODE == "full")
+_startup_times["schema"] = time.perf_counter() - _schema_started
 
 app = FastAPI()
 
@@ -26,6 +45,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost: latency / size / SQL counts per route, see metrics.py
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_engine(database.engine)
+metrics.instrument_engine(database.async_engine.sync_engine)
+
 def get_db():
     db = database.SessionLocal()
     try:
@@ -33,20 +57,99 @@ def get_db():
     finally:
         db.close()
 
+def _in_session(fn, *args):
+    # fn(db, *args) on a sync session of its own, for run_in_threadpool
+    with database.SessionLocal() as db:
+        return fn(db, *args)
+
+async def get_async_db():
+    # Request path: crud functions run inside db.run_sync on the async connection
+    async with database.AsyncSessionLocal() as db:
+        yield db
+
+# Same-date saves / day locks queue on an asyncio lock; crud's own threading
+# lock is then never contended on the event loop thread
+_async_date_locks = weakref.WeakValueDictionary() # a date's entry goes when no request holds or awaits it
+
+def _async_date_lock(date: str):
+    lock = _async_date_locks.get(date)
+    if lock is None:
+        lock = _async_date_locks[date] = asyncio.Lock()
+    return lock
+
+# Conditional GET: strong ETags derived from data_versions, encoded results memoized per ETag
+REPORT_CACHE_SIZE = 256
+_report_cache = OrderedDict()
+_report_cache_lock = threading.Lock()
+
+def _etag(key, versions):
+    return '"' + hashlib.sha1(repr((key, versions)).encode()).hexdigest()[:24] + '"'
+
+def _etag_matches(request: Request, etag: str):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in header.split(",")]
+    return "*" in tags or etag in tags
+
+async def versioned_json(request: Request, db: AsyncSession, key, scopes, compute):
+    # compute: coroutine function returning the JSON-encoded payload
+    versions = await db.run_sync(crud.get_data_versions, list(scopes) + ["master"])
+    etag = _etag(key, versions)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    with _report_cache_lock:
+        content = _report_cache.get(etag)
+        if content is not None:
+            _report_cache.move_to_end(etag)
+    if content is None:
+        content = await compute()
+        with _report_cache_lock:
+            _report_cache[etag] = content
+            while len(_report_cache) > REPORT_CACHE_SIZE:
+                _report_cache.popitem(last=False)
+    return JSONResponse(content=content, headers=headers)
+
+def snapshot_response(request: Request, snapshot, media_type: str, headers: dict = None):
+    # Locked periods: the frozen blob is served from disk, its digest is the ETag
+    digest, path = snapshot
+    headers = {"ETag": f'"{digest}"', "Cache-Control": "no-cache", **(headers or {})}
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=media_type, headers=headers)
+
 # Initial Data Seeding
 @app.on_event("startup")
 def startup_populate():
     db = database.SessionLocal()
     try:
-        crud.seed_data(db)
+        seed_started = time.perf_counter()
+        seeded = migrations.ensure_seed(db, force=STARTUP_MODE == "full")
+        _startup_times["seed"] = time.perf_counter() - seed_started
+        export_jobs.recover(db)
+        export_jobs.cleanup(db)
     finally:
         db.close()
+    _startup_log.info(
+        "Ready %.0f ms after import (imports %.0f ms, schema %s %.0f ms, seed %s %.0f ms)",
+        (time.perf_counter() - _import_started) * 1000,
+        _startup_times["imports"] * 1000,
+        "updated" if _schema_updated else "up to date", _startup_times["schema"] * 1000,
+        "applied" if seeded else "up to date", _startup_times["seed"] * 1000,
+    )
+
+@app.on_event("shutdown")
+def shutdown_export_workers():
+    export_jobs.shutdown()
 
 # Staff Endpoints
 @app.get("/api/staff", response_model=List[schemas.Staff])
-def read_staff(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_staff(db, skip, limit)
+async def read_staff(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(crud.get_staff, skip, limit)
 
+# Adding / removing 自社 rebuilds the daily_points rollup: sync endpoints, like the room ones
 @app.post("/api/staff", response_model=schemas.Staff)
 def create_staff(staff: schemas.StaffCreate, db: Session = Depends(get_db)):
     return crud.create_staff(db, staff)
@@ -59,9 +162,10 @@ def delete_staff(staff_id: int, db: Session = Depends(get_db)):
 
 # Room Endpoints
 @app.get("/api/rooms", response_model=List[schemas.Room])
-def read_rooms(skip: int = 0, limit: int = 1000, db: Session = Depends(get_db)):
-    return crud.get_rooms(db, skip, limit)
+async def read_rooms(skip: int = 0, limit: int = 1000, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(crud.get_rooms, skip, limit)
 
+# Room changes rebuild the daily_points rollup: sync endpoints, so that runs in the threadpool
 @app.post("/api/rooms", response_model=schemas.Room)
 def create_room(room: schemas.RoomCreate, db: Session = Depends(get_db)):
     return crud.create_room(db, room)
@@ -74,191 +178,366 @@ def delete_room(room_id: int, db: Session = Depends(get_db)):
 
 # Records & Reports
 @app.post("/api/records")
-def create_records(records: List[schemas.CleaningRecordCreate], date: str = None, db: Session = Depends(get_db)):
-    return crud.create_cleaning_records(db, records, target_date=date)
+async def create_records(records: List[schemas.CleaningRecordCreate], date: str = None, db: AsyncSession = Depends(get_async_db)):
+    target_date = date or (records[0].date if records else None)
+    if not target_date:
+        return await db.run_sync(crud.create_cleaning_records, records, date)
+    async with _async_date_lock(target_date):
+        return await db.run_sync(crud.create_cleaning_records, records, date)
+
+@app.patch("/api/records/{date}")
+async def patch_records(date: str, changes: List[schemas.CleaningRecordPatch], db: AsyncSession = Depends(get_async_db)):
+    async with _async_date_lock(date):
+        return await db.run_sync(crud.patch_cleaning_records, date, changes)
 
 @app.get("/api/records/raw")
-def get_raw_records(date: str, db: Session = Depends(get_db)):
-    records = crud.get_raw_records(db, date)
-    return {"records": records}
+async def get_raw_records(date: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    def raw(session):
+        return jsonable_encoder({"records": crud.get_raw_records(session, date)})
+    return await versioned_json(request, db, ("raw", date), [f"date:{date}"], lambda: db.run_sync(raw))
 
 @app.get("/api/reports/daily")
-def get_daily_report(date: str, db: Session = Depends(get_db)):
-    return crud.get_daily_report(db, date)
+async def get_daily_report(date: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    return await versioned_json(request, db, ("daily", date), [f"date:{date}"],
+                                lambda: render.daily_report(db, date))
 
 @app.get("/api/reports/vendor")
-def get_vendor_report(date: str, db: Session = Depends(get_db)):
-    return crud.get_vendor_report(db, date)
+async def get_vendor_report(date: str, request: Request, end_date: str = None, db: AsyncSession = Depends(get_async_db)):
+    snapshot = None if end_date else await db.run_sync(crud.get_report_snapshot, f"date:{date}", "vendor", "json")
+    if snapshot:
+        return snapshot_response(request, snapshot, "application/json")
+    scopes = crud.month_scopes(date, end_date) if end_date else [f"date:{date}"]
+    return await versioned_json(request, db, ("vendor", date, end_date), scopes,
+                                lambda: render.vendor_report(db, date, end_date))
 
 @app.get("/api/reports/vendor/export")
-def export_vendor_report(date: str, db: Session = Depends(get_db)):
-    data = crud.get_vendor_report(db, date)
-    reports = data.get("staff_reports", {})
-    if not reports:
+async def export_vendor_report(date: str, request: Request, end_date: str = None, db: AsyncSession = Depends(get_async_db)):
+    filename = f"vendor_report_{date}_{end_date}.xlsx" if end_date else f"vendor_report_{date}.xlsx"
+    disposition = {"Content-Disposition": f"attachment; filename={filename}"}
+    snapshot = None if end_date else await db.run_sync(crud.get_report_snapshot, f"date:{date}", "vendor", "xlsx")
+    if snapshot:
+        return snapshot_response(request, snapshot, excel_export.XLSX_MEDIA_TYPE, disposition)
+
+    chunks = await render.vendor_workbook(db, date, end_date)
+    if chunks is None:
         raise HTTPException(status_code=404, detail="No data for this date")
-    
-    types = ["DB", "TW", "TRP", "SW", "D・D"]
-    floors = [str(f) for f in range(7, 13)]
-
-    def append_matrix_to_rows(target_rows, title, matrix, total_pts):
-        target_rows.append({"Floor": f"--- {title} ---"})
-        staff_rows = []
-        for f in floors:
-            row = {"Floor": f"{f}F"}
-            for t in types:
-                row[t] = matrix.get(f, {}).get(t, 0.0)
-            row["Total"] = matrix.get(f, {}).get("Total", 0.0)
-            staff_rows.append(row)
-        
-        df_temp = pd.DataFrame(staff_rows)
-        totals_row = {"Floor": "合計"}
-        for t in types:
-            totals_row[t] = df_temp[t].sum()
-        totals_row["Total"] = df_temp["Total"].sum()
-        
-        target_rows.extend(staff_rows)
-        target_rows.append(totals_row)
-        target_rows.append({"Floor": ""}) # Spacer
-
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # 1. Summary Sheet (Sequence 1-4)
-        all_summary_data = []
-        
-        # Section 1: Individual Staff
-        for s_name, rep in reports.items():
-            append_matrix_to_rows(all_summary_data, f"作業者日報: {s_name}", rep["matrix"], rep["total_points"])
-        
-        # Section 2: Vendor Total
-        append_matrix_to_rows(all_summary_data, "ワールドクリーン（外注）", data["vendor_total"]["matrix"], data["vendor_total"]["total_points"])
-        
-        # Section 3: In-House Total
-        append_matrix_to_rows(all_summary_data, "ベストクリエイト（自社）", data["in_house_total"]["matrix"], data["in_house_total"]["total_points"])
-        
-        # Section 4: Hotel Total
-        append_matrix_to_rows(all_summary_data, "ポートタワーホテル（全体）", data["hotel_total"]["matrix"], data["hotel_total"]["total_points"])
-
-        df_all_summary = pd.DataFrame(all_summary_data)
-        cols = ["Floor"] + types + ["Total"]
-        df_all_summary = df_all_summary[cols].rename(columns={"Floor": "フロア", "Total": "合計"})
-        df_all_summary.to_excel(writer, index=False, sheet_name='集計表')
-
-        # 2. Details Sheet
-        detail_rows = []
-        for staff_name, rep in reports.items():
-            for d in rep["details"]:
-                detail_rows.append({
-                    "作業者": staff_name,
-                    "部屋番号": d["room"],
-                    "タイプ": d["type"],
-                    "作業内容": d["work"],
-                    "ポイント": d["points"]
-                })
-        
-        if detail_rows:
-            df_detail = pd.DataFrame(detail_rows)
-            df_detail.to_excel(writer, index=False, sheet_name='詳細')
-
-    output.seek(0)
-    filename = f"vendor_report_{date}.xlsx"
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
-    )
+    return StreamingResponse(chunks, media_type=excel_export.XLSX_MEDIA_TYPE, headers=disposition)
 
 @app.get("/api/reports/monthly")
-def get_monthly_report(year_month: str, db: Session = Depends(get_db)):
+async def get_monthly_report(year_month: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     # year_month format: "YYYY-MM"
-    return crud.get_monthly_report(db, year_month)
+    snapshot = await db.run_sync(crud.get_report_snapshot, f"month:{year_month}", "monthly", "json")
+    if snapshot:
+        return snapshot_response(request, snapshot, "application/json")
+    return await versioned_json(request, db, ("monthly", year_month), [f"month:{year_month}"],
+                                lambda: render.monthly_report(db, year_month))
+
+@app.get("/api/reports/staff-monthly")
+async def get_staff_monthly_report(year_month: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    # Per-staff statement for payroll / vendor billing, see crud.get_staff_monthly_report
+    return await versioned_json(request, db, ("staff-monthly", year_month), [f"month:{year_month}"],
+                                lambda: render.staff_monthly_report(db, year_month))
+
+@app.get("/api/reports/staff-monthly/export")
+async def export_staff_monthly_report(year_month: str, db: AsyncSession = Depends(get_async_db)):
+    chunks = await render.staff_monthly_workbook(db, year_month)
+    if chunks is None:
+        raise HTTPException(status_code=404, detail="No data for this month")
+    return StreamingResponse(
+        chunks,
+        media_type=excel_export.XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename=staff_monthly_report_{year_month}.xlsx"}
+    )
+
+@app.get("/api/reports/range")
+async def get_range_report(start: str, end: str, request: Request, group_by: str = "month", split: str = "staff",
+                           db: AsyncSession = Depends(get_async_db)):
+    # Time series of points over [start, end], see range_report.py
+    def compute(session):
+        return jsonable_encoder(range_report.get_range_report(session, start, end, group_by, split))
+    return await versioned_json(request, db, ("range", start, end, group_by, split), crud.month_scopes(start, end),
+                                lambda: db.run_sync(compute))
+
+@app.get("/api/reports/cube")
+async def query_report_cube(year_month: str, request: Request, by: str = "", measure: str = "points",
+                            db: AsyncSession = Depends(get_async_db)):
+    # Slice / rollup of the month cube, see cube.py:
+    #   /api/reports/cube?year_month=2025-03&by=staff,type&floor=7,8&kind=bed,bath
+    # Filters are comma-separated labels per dimension (day, floor, type, staff, kind)
+    dims = tuple(d for d in by.split(",") if d)
+    where = {d: tuple(request.query_params[d].split(",")) for d in cube.DIMENSIONS if d in request.query_params}
+    key = ("cube", year_month, dims, measure, tuple(sorted(where.items())))
+    return await versioned_json(request, db, key, [f"month:{year_month}"],
+                                lambda: render.cube_query(db, year_month, dims, where, measure))
 
 @app.get("/api/reports/monthly/export")
-def export_monthly_report(year_month: str, db: Session = Depends(get_db)):
-    data = crud.get_monthly_report(db, year_month)
-    vendor_data = data["vendor_monthly"]
-    hotel_data = data["hotel_monthly"]
+async def export_monthly_report(year_month: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    filename = f"monthly_report_{year_month}.xlsx"
+    disposition = {"Content-Disposition": f"attachment; filename={filename}"}
+    snapshot = await db.run_sync(crud.get_report_snapshot, f"month:{year_month}", "monthly", "xlsx")
+    if snapshot:
+        return snapshot_response(request, snapshot, excel_export.XLSX_MEDIA_TYPE, disposition)
 
-    if not vendor_data and not hotel_data:
+    chunks = await render.monthly_workbook(db, year_month)
+    if chunks is None:
         raise HTTPException(status_code=404, detail="No data for this month")
+    return StreamingResponse(chunks, media_type=excel_export.XLSX_MEDIA_TYPE, headers=disposition)
+
+# Background Export Jobs
+@app.post("/api/exports")
+async def create_export_job(job: schemas.ExportJobCreate, db: AsyncSession = Depends(get_async_db)):
+    await db.run_sync(export_jobs.cleanup)
+    return await db.run_sync(export_jobs.submit, job.kind, job.date, job.end_date, job.year_month)
+
+@app.get("/api/exports/{job_id}")
+async def get_export_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(export_jobs.get_status, job_id)
+
+@app.get("/api/exports/{job_id}/download")
+async def download_export_job(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    path, filename = await db.run_sync(export_jobs.get_artifact, job_id)
+    return FileResponse(
+        path,
+        media_type=excel_export.XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+# Image Analysis (OCR)
+async def analyze_stored(stored: image_pipeline.StoredImage):
+    # OCR of a normalized upload, read back through mmap
+    opened = image_pipeline.open_blob(stored.digest)
+    if opened is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    blob, mime_type = opened
+    try:
+        result = await ocr_service.analyze(blob, mime_type)
+    except ocr_service.UnsupportedImage as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except ocr_service.OcrUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except ocr_service.OcrError as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    finally:
+        blob.close()
+    return {
+        "result": result.text,
+        "digest": result.digest,
+        "cached": result.cached,
+        "backend": result.backend,
+        "upload": {"digest": stored.digest, "mime_type": stored.mime_type, "size": stored.size,
+                   "width": stored.width, "height": stored.height, "reused": stored.reused},
+    }
+
+def parse_crop(crop: str):
+    try:
+        return image_pipeline.parse_crop(crop)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+async def ingest_upload(image_bytes: bytes, crop_box=None, rotate: int = 0, deskew: bool = False):
+    try:
+        return await render.run(image_pipeline.ingest, image_bytes, crop_box, rotate, deskew)
+    except ocr_service.UnsupportedImage as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except OSError as e: # Pillow could not decode the file
+        raise HTTPException(status_code=415, detail=f"Unreadable image: {e}")
+
+async def resolver_index(db: AsyncSession, date: str):
+    # Name / room index for resolving OCR rows of `date`, or None when no date was given
+    if not date:
+        return None
+    crud.report_day_range(date)
+    return await db.run_sync(ocr_resolver.get_index)
+
+@app.post("/api/analyze")
+async def analyze_image(
+    file: UploadFile = File(...),
+    crop: str = Form(None), # "x,y,w,h" fractions of the photo
+    rotate: int = Form(0), # clockwise degrees
+    deskew: bool = Form(False),
+    date: str = Form(None), # also resolve the rows into records for this date
+    db: AsyncSession = Depends(get_async_db),
+):
+    index = await resolver_index(db, date)
+    image_bytes = await file.read()
+    stored = await ingest_upload(image_bytes, parse_crop(crop), rotate, deskew)
+    body = await analyze_stored(stored)
+    if index is not None:
+        body["resolved"] = ocr_resolver.resolve_text(index, date, body["result"])
+    return body
+
+@app.post("/api/ocr/resolve")
+async def resolve_ocr_rows(payload: schemas.OcrResolveRequest, db: AsyncSession = Depends(get_async_db)):
+    # OCR rows -> records for POST /api/records, with per-row ids and confidences
+    crud.report_day_range(payload.date) # 400 on a missing / malformed date: the index needs one
+    index = await resolver_index(db, payload.date)
+    if payload.rows is not None:
+        records, details = ocr_resolver.resolve_rows(index, payload.date, payload.rows)
+        return {"records": records, "rows": details, "review": sum(d["review"] for d in details)}
+    resolved = ocr_resolver.resolve_text(index, payload.date, payload.text)
+    if "error" in resolved:
+        raise HTTPException(status_code=400, detail=resolved["error"])
+    return resolved
+
+# Batch OCR: many sheets (or a multi-page PDF) in one request.
+# Every page is normalized and analyzed concurrently (bounded by the render pool
+# and OCR_CONCURRENCY) and reported as a server-sent event as soon as it finishes:
+#   event: start  {"pages": [{"index", "filename", "page"}, ...]}
+#   event: page   {"index", "filename", "page", "result", "digest", "cached", "backend", "upload"}
+#                 (+ "resolved": records for `date`, when the form has a date)
+#   event: error  {"index", "filename", "page", "status", "detail"}   (that page only)
+#   event: done   {"pages", "failed", "elapsed_ms"}
+BATCH_MAX_PAGES = int(os.environ.get("BATCH_MAX_PAGES", 50))
+
+def _sse(event: str, data: dict):
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+async def _analyze_page(page: dict, image_bytes: bytes, crop_box, rotate: int, deskew: bool, index=None, date=None):
+    try:
+        stored = await ingest_upload(image_bytes, crop_box, rotate, deskew)
+        body = await analyze_stored(stored)
+        if index is not None:
+            body["resolved"] = ocr_resolver.resolve_text(index, date, body["result"])
+        return "page", {**page, **body}
+    except HTTPException as e:
+        return "error", {**page, "status": e.status_code, "detail": e.detail}
+    except Exception as e:
+        return "error", {**page, "status": 500, "detail": f"{type(e).__name__}: {e}"}
+
+@app.post("/api/analyze/batch")
+async def analyze_batch(
+    files: List[UploadFile] = File(...),
+    crop: str = Form(None), # applied to every page
+    rotate: int = Form(0),
+    deskew: bool = Form(False),
+    date: str = Form(None),
+    db: AsyncSession = Depends(get_async_db),
+):
+    crop_box = parse_crop(crop)
+    index = await resolver_index(db, date) # resolved up front: the stream does not touch the DB
+    pages = [] # (page info, bytes)
+    for upload in files:
+        data = await upload.read()
+        if ocr_service.sniff_mime(data) == "application/pdf":
+            parts = await render.run(image_pipeline.split_pdf, data)
+        else:
+            parts = [data]
+        for number, part in enumerate(parts, start=1):
+            info = {"index": len(pages), "filename": upload.filename, "page": number if len(parts) > 1 else None}
+            pages.append((info, part))
+            if len(pages) > BATCH_MAX_PAGES:
+                raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_PAGES} pages per batch")
+
+    async def events():
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(_analyze_page(info, data, crop_box, rotate, deskew, index, date)) for info, data in pages]
+        failed = 0
+        try:
+            yield _sse("start", {"pages": [info for info, _ in pages]})
+            for next_done in asyncio.as_completed(tasks):
+                event, data = await next_done
+                failed += event == "error"
+                yield _sse(event, data)
+            yield _sse("done", {"pages": len(pages), "failed": failed,
+                                "elapsed_ms": round((time.perf_counter() - started) * 1000)})
+        finally:
+            # Client went away: stop the pages still queued
+            for task in tasks:
+                task.cancel()
 
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Helper to prepare monthly rows
-        def prepare_rows(monthly_dict, types):
-            rows = []
-            sorted_days = sorted(monthly_dict.keys())
-            for day in sorted_days:
-                stats = monthly_dict[day]
-                row = {"日付": day}
-                for t in types:
-                    row[t] = stats.get(t, 0.0)
-                row["合計"] = stats.get("Total", 0.0)
-                rows.append(row)
-            
-            if rows:
-                df_temp = pd.DataFrame(rows)
-                totals_row = {"日付": "月間合計"}
-                for t in types:
-                    totals_row[t] = df_temp[t].sum()
-                totals_row["合計"] = df_temp["合計"].sum()
-                rows.append(totals_row)
-            return rows
-
-        # 1. Vendor Monthly
-        v_types = ["DB", "TW", "TRP", "SW"]
-        v_rows = prepare_rows(vendor_data, v_types)
-        df_v = pd.DataFrame(v_rows)
-        df_v.to_excel(writer, index=False, sheet_name='ワールドクリーン月報')
-
-        # 2. Hotel Monthly
-        h_types = ["DB", "TW", "TRP", "SW", "D・D"]
-        h_rows = prepare_rows(hotel_data, h_types)
-        df_h = pd.DataFrame(h_rows)
-        df_h.to_excel(writer, index=False, sheet_name='ホテル全体月報')
-
-    output.seek(0)
-    filename = f"monthly_report_{year_month}.xlsx"
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
+@app.get("/api/uploads/{digest}")
+async def get_upload(digest: str):
+    found = image_pipeline.find(digest)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return FileResponse(found[0], media_type=found[1])
+
+@app.post("/api/uploads/{digest}/analyze")
+async def reanalyze_upload(digest: str):
+    found = image_pipeline.find(digest)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    stored = image_pipeline.StoredImage(digest, found[1], os.path.getsize(found[0]), reused=True)
+    return await analyze_stored(stored)
+
+# Monitoring
+@app.get("/metrics")
+def read_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 # Data Management (Backup/Restore)
 @app.get("/api/admin/export")
-def export_database_json(db: Session = Depends(get_db)):
-    return crud.get_all_data(db)
+def export_database(compress: bool = True):
+    # NDJSON stream (gzip by default), see backup.py for the format
+    ext = "ndjson.gz" if compress else "ndjson"
+    filename = f"cleaning_data_backup_{datetime.date.today().isoformat()}.{ext}"
+    return StreamingResponse(
+        backup.iter_backup(compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
 
 @app.post("/api/admin/import")
-def import_database_json(data: dict, db: Session = Depends(get_db)):
+def import_database(file: UploadFile = File(...), db: Session = Depends(get_db)):
+    # Accepts .ndjson / .ndjson.gz backups and legacy .json exports
     try:
-        crud.restore_all_data(db, data)
-        return {"message": "Database restored successfully"}
+        counts = backup.restore_backup(db, file.file)
+        return {"message": "Database restored successfully", "counts": counts}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid backup: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/admin/archive")
+def list_archived_months(db: Session = Depends(get_db)):
+    return {"months": [
+        {"year_month": e.year_month, "rows": e.rows, "format": e.format} for e in archive.entries(db)
+    ]}
+
+@app.post("/api/admin/archive")
+def archive_months(year_month: str = None, db: Session = Depends(get_db)):
+    # Archive stage: move locked months out of cleaning_records (one month, or every locked one)
+    if year_month:
+        result = archive.archive_month(db, year_month)
+        archived = [result] if result else []
+    else:
+        archived = archive.archive_locked_months(db)
+    return {"archived": archived}
+
 # Monthly Locking
 @app.get("/api/locks/{year_month}")
-def get_lock_status(year_month: str, db: Session = Depends(get_db)):
-    return {"year_month": year_month, "is_locked": crud.is_month_locked(db, year_month)}
+async def get_lock_status(year_month: str, db: AsyncSession = Depends(get_async_db)):
+    return {"year_month": year_month, "is_locked": await db.run_sync(crud.is_month_locked, year_month)}
 
 @app.post("/api/locks")
 def set_lock_status(lock_data: schemas.MonthlyLockBase, db: Session = Depends(get_db)):
+    # Sync: capturing the month's snapshots / restoring its archive runs in the threadpool
     return crud.lock_month(db, lock_data.year_month, lock_data.is_locked)
 
 # Daily Locking
 @app.get("/api/daily-locks/{date}")
-def get_daily_lock_status(date: str, db: Session = Depends(get_db)):
-    lock = crud.get_daily_lock(db, date)
+async def get_daily_lock_status(date: str, db: AsyncSession = Depends(get_async_db)):
+    lock = await db.run_sync(crud.get_daily_lock, date)
     return {"date": date, "is_locked": lock.is_locked == 1}
 
 @app.post("/api/daily-locks/{date}")
-def set_daily_lock_status(date: str, lock_data: schemas.DailyLockUpdate, db: Session = Depends(get_db)):
+async def set_daily_lock_status(date: str, lock_data: schemas.DailyLockUpdate, db: AsyncSession = Depends(get_async_db)):
     # Cannot unlock if month is locked
     year_month = date[:7]
-    if lock_data.is_locked == 0 and crud.is_month_locked(db, year_month):
+    if lock_data.is_locked == 0 and await db.run_sync(crud.is_month_locked, year_month):
         raise HTTPException(status_code=403, detail=f"Cannot unlock: Month {year_month} is locked.")
-    return crud.lock_day(db, date, lock_data.is_locked)
+    async with _async_date_lock(date):
+        # Snapshot capture is CPU work: run it on a threadpool session, not on the event loop
+        return await run_in_threadpool(_in_session, crud.lock_day, date, lock_data.is_locked)
+
 if __name__ == "__main__":
     # Renderが指定するポート番号を取得（なければ8000番を使用）
     port = int(os.environ.get("PORT", 8000))
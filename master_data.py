@@ -0,0 +1,83 @@
+import threading
+from dataclasses import dataclass
+from sqlalchemy import select
+import models
+
+# Process-wide cache of the rooms / staff master tables.
+# The cache is keyed on the "master" row of data_versions, which every master
+# write bumps in its own transaction, so other processes (uvicorn workers, the
+# export pool, CLI scripts) see changes on their next read; one single-row read
+# per call. invalidate() additionally forces a reload in this process.
+# A session that has bumped "master" itself (see crud.bump_data_versions) reads
+# its uncommitted state directly and never fills the cache.
+
+@dataclass(frozen=True)
+class RoomRow:
+    id: int
+    number: str
+    type: str
+    floor: int
+
+@dataclass(frozen=True)
+class StaffRow:
+    id: int
+    name: str
+
+class MasterData:
+    def __init__(self, version, bind, rooms, staff):
+        self.version = version
+        self.bind = bind
+        self.rooms = rooms # ordered by id
+        self.staff = staff # ordered by id
+        self.room_map = {r.id: r for r in rooms}
+        self.staff_map = {s.id: s for s in staff}
+        self.staff_name_map = {s.id: s.name for s in staff}
+        in_house_staff = next((s for s in staff if s.name == "自社"), None)
+        self.in_house_id = in_house_staff.id if in_house_staff else -1
+
+_lock = threading.Lock()
+_version = 0
+_cache = None
+
+def invalidate():
+    global _version
+    with _lock:
+        _version += 1
+
+def get_version():
+    return _version
+
+def _db_version(db):
+    # None while this session has uncommitted master changes
+    if "master" in db.info.get("bumped_scopes", ()):
+        return None
+    return db.execute(
+        select(models.DataVersion.version).where(models.DataVersion.scope == "master")
+    ).scalar() or 0
+
+def get_master(db):
+    global _cache
+    bind = db.get_bind()
+    db_version = _db_version(db)
+    cache = _cache
+    if db_version is not None and cache is not None and cache.version == (db_version, _version) and cache.bind is bind:
+        return cache
+
+    # Capture the versions before loading so a concurrent write or invalidate() forces a reload.
+    # The lock is never held across the queries: async sessions run them on the
+    # event loop thread, where a second waiter would block the loop.
+    version = (db_version, _version)
+    rooms = [
+        RoomRow(id=r.id, number=r.number, type=r.type, floor=r.floor)
+        for r in db.query(models.Room).order_by(models.Room.id).all()
+    ]
+    staff = [
+        StaffRow(id=s.id, name=s.name)
+        for s in db.query(models.Staff).order_by(models.Staff.id).all()
+    ]
+    loaded = MasterData(version, bind, rooms, staff)
+    if db_version is not None:
+        with _lock:
+            if version[1] == _version:
+                _cache = loaded
+    return loaded
@@ -0,0 +1,201 @@
+import bisect
+import contextvars
+import logging
+import os
+import re
+import threading
+import time
+from sqlalchemy import event
+
+# Per-request instrumentation, exposed in Prometheus text format on /metrics.
+# MetricsMiddleware times every request per route template ("/api/records/{date}",
+# not the concrete URL) and counts response bytes; SQLAlchemy cursor events add
+# the statements run on behalf of the request (sync and async engines alike, the
+# request's RequestStats travels in a context variable). Requests slower than
+# SLOW_REQUEST_MS are logged with their heaviest statements.
+# Counters are per process: with several uvicorn workers, scrape each one.
+#
+#   SLOW_REQUEST_MS  slow-request log threshold (default 500, 0 disables)
+#   SLOW_QUERY_TOP   statements listed per slow request (default 5)
+
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 500))
+SLOW_QUERY_TOP = int(os.environ.get("SLOW_QUERY_TOP", 5))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # seconds
+DB_TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5) # seconds
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500) # statements
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304) # bytes
+
+logger = logging.getLogger("hotel.slow_requests")
+
+class RequestStats:
+    __slots__ = ("sql_count", "sql_time", "statements")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.statements = {} # normalized SQL -> [count, seconds]
+
+    def add(self, statement: str, elapsed: float):
+        self.sql_count += 1
+        self.sql_time += elapsed
+        entry = self.statements.get(statement)
+        if entry is None:
+            self.statements[statement] = [1, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+
+_current = contextvars.ContextVar("request_stats", default=None)
+
+# Metric types
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, labels):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self._series = {} # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            if slot < len(self.buckets):
+                series[slot] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for label_values, series in items:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{labels}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{labels}}} {series[-1]}")
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for label_values, value in items:
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, label_values))
+            lines.append(f"{self.name}{{{labels}}} {value}")
+        return lines
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+ROUTE_LABELS = ("method", "route")
+
+REQUESTS = Counter("http_requests_total", "Requests by route and status.", ("method", "route", "status"))
+LATENCY = Histogram("http_request_duration_seconds", "Request latency until the last body byte.", LATENCY_BUCKETS, ROUTE_LABELS)
+RESPONSE_SIZE = Histogram("http_response_size_bytes", "Response body size.", SIZE_BUCKETS, ROUTE_LABELS)
+SQL_STATEMENTS = Histogram("http_request_sql_statements", "SQL statements executed per request.", QUERY_BUCKETS, ROUTE_LABELS)
+SQL_TIME = Histogram("http_request_db_seconds", "Time spent in SQL statements per request.", DB_TIME_BUCKETS, ROUTE_LABELS)
+SLOW_REQUESTS = Counter("http_slow_requests_total", "Requests over SLOW_REQUEST_MS.", ROUTE_LABELS)
+
+METRICS = [REQUESTS, LATENCY, RESPONSE_SIZE, SQL_STATEMENTS, SQL_TIME, SLOW_REQUESTS]
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# SQLAlchemy
+
+_whitespace = re.compile(r"\s+")
+
+def instrument_engine(engine):
+    # Sync Engine, or AsyncEngine.sync_engine for the async one
+    # The start time lives on the statement's execution context, which a failed
+    # statement simply drops; nothing accumulates on the pooled connection
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        if context is not None and _current.get() is not None:
+            context.metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stats = _current.get()
+        started = getattr(context, "metrics_started", None)
+        if stats is None or started is None:
+            return
+        del context.metrics_started
+        stats.add(_whitespace.sub(" ", statement).strip(), time.perf_counter() - started)
+
+# ASGI middleware
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        state = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self.record(scope, state["status"], state["size"], time.perf_counter() - started, stats)
+
+    def record(self, scope, status, size, elapsed, stats):
+        route = scope.get("route")
+        # Unmatched paths share one label so scanners cannot blow up the series count
+        labels = (scope["method"], getattr(route, "path", None) or "unmatched")
+        REQUESTS.inc(labels + (str(status),))
+        LATENCY.observe(labels, elapsed)
+        RESPONSE_SIZE.observe(labels, size)
+        SQL_STATEMENTS.observe(labels, stats.sql_count)
+        SQL_TIME.observe(labels, stats.sql_time)
+        if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+            SLOW_REQUESTS.inc(labels)
+            log_slow(scope, status, elapsed, stats)
+
+def log_slow(scope, status, elapsed, stats):
+    top = sorted(stats.statements.items(), key=lambda item: item[1][1], reverse=True)[:SLOW_QUERY_TOP]
+    lines = [
+        f"slow request {scope['method']} {scope['path']} -> {status} in {elapsed * 1000:.0f} ms; "
+        f"{stats.sql_count} SQL statements, {stats.sql_time * 1000:.0f} ms in the DB"
+    ]
+    for statement, (count, seconds) in top:
+        lines.append(f"  {seconds * 1000:8.1f} ms  x{count:<4} {statement[:200]}")
+    logger.warning("\n".join(lines))
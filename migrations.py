@@ -0,0 +1,159 @@
+import datetime
+import hashlib
+from sqlalchemy import inspect, text, select, insert, delete
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+import models, crud, archive
+
+# Versioned schema migrations, applied in order at startup (see main.py).
+# create_all() runs first, so every step must also be a no-op on a fresh
+# database that already has the latest columns and indexes.
+#
+# Startup gate: app_state stores the schema fingerprint (tables, columns, indexes
+# and migration versions of this code) and the seed version last applied. When
+# both match, a boot skips create_all, the migration checks and seed_data and
+# costs one SELECT.
+
+SEED_VERSION = 1 # bump when crud.STAFF_NAMES / crud.ROOM_LAYOUT change
+
+def _columns(conn, table):
+    return {c["name"] for c in inspect(conn).get_columns(table)}
+
+def _create_indexes(conn, model):
+    for index in model.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+
+def _add_record_status(conn):
+    # Replaces the old hand-run db_migrate.py / migrate_status.py
+    if "status" not in _columns(conn, "cleaning_records"):
+        conn.execute(text("ALTER TABLE cleaning_records ADD COLUMN status VARCHAR DEFAULT 'draft'"))
+
+def _add_day_columns(conn):
+    # Typed integer day next to the YYYY-MM-DD string, backfilled per distinct date
+    for table in ("cleaning_records", "daily_points"):
+        if "day" not in _columns(conn, table):
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN day INTEGER"))
+
+        dates = conn.execute(text(f"SELECT DISTINCT date FROM {table} WHERE day IS NULL")).scalars().all()
+        for date in dates:
+            try:
+                day = crud.day_number(date)
+            except Exception:
+                continue # leave malformed legacy dates unindexed
+            conn.execute(text(f"UPDATE {table} SET day = :day WHERE date = :date"), {"day": day, "date": date})
+
+def _add_record_indexes(conn):
+    # (day, room_id) composite + staff indexes for reports
+    _create_indexes(conn, models.CleaningRecord)
+    _create_indexes(conn, models.DailyPoints)
+
+def _backfill_daily_points(conn):
+    # Databases created before the rollup table existed start with it empty
+    has_points = conn.execute(text("SELECT 1 FROM daily_points LIMIT 1")).first()
+    has_records = conn.execute(text("SELECT 1 FROM cleaning_records LIMIT 1")).first()
+    if has_records and not has_points:
+        with Session(bind=conn) as db:
+            crud.rebuild_daily_points(db)
+
+def _autoincrement_record_ids(conn):
+    # SQLite reuses the highest rowid once it is deleted, e.g. by archiving the latest
+    # month; archived records keep their ids, so rebuild the table as AUTOINCREMENT
+    if conn.dialect.name != "sqlite":
+        return
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'cleaning_records'")).scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return
+    table = models.CleaningRecord.__table__
+    cols = ", ".join(c.name for c in table.columns)
+    conn.execute(text("ALTER TABLE cleaning_records RENAME TO cleaning_records_old"))
+    for index in table.indexes:
+        conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+    table.create(bind=conn)
+    conn.execute(text(f"INSERT INTO cleaning_records ({cols}) SELECT {cols} FROM cleaning_records_old"))
+    conn.execute(text("DROP TABLE cleaning_records_old"))
+
+    # Start the sequence past the archived ids too
+    archived = archive.read_records(conn)
+    top = int(archived[:, 0].max()) if archived is not None and len(archived) else 0
+    if conn.execute(text("SELECT 1 FROM sqlite_sequence WHERE name = 'cleaning_records'")).first():
+        conn.execute(text("UPDATE sqlite_sequence SET seq = MAX(seq, :top) WHERE name = 'cleaning_records'"), {"top": top})
+    elif top:
+        conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('cleaning_records', :top)"), {"top": top})
+
+MIGRATIONS = [
+    (1, "add_record_status", _add_record_status),
+    (2, "add_day_columns", _add_day_columns),
+    (3, "add_record_indexes", _add_record_indexes),
+    (4, "backfill_daily_points", _backfill_daily_points),
+    (5, "autoincrement_record_ids", _autoincrement_record_ids),
+]
+
+def get_applied_versions(engine):
+    models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return set(conn.execute(select(models.SchemaMigration.version)).scalars().all())
+
+def run_migrations(engine):
+    applied = get_applied_versions(engine)
+    done = []
+    for version, name, step in MIGRATIONS:
+        if version in applied:
+            continue
+        # One transaction per step so a failure leaves the version unrecorded
+        with engine.begin() as conn:
+            step(conn)
+            conn.execute(insert(models.SchemaMigration).values(
+                version=version, name=name, applied_at=datetime.datetime.now().isoformat(timespec="seconds")
+            ))
+        done.append(name)
+    return done
+
+# Startup gate
+
+def schema_fingerprint():
+    tables = [
+        (t.name, sorted(c.name for c in t.columns), sorted(i.name for i in t.indexes))
+        for t in sorted(models.Base.metadata.tables.values(), key=lambda t: t.name)
+    ]
+    return hashlib.sha1(repr((tables, [m[0] for m in MIGRATIONS])).encode()).hexdigest()[:16]
+
+def read_state(bind):
+    # {key: value} from app_state; {} on a database that predates it
+    try:
+        with bind.connect() as conn:
+            return dict(conn.execute(select(models.AppState.key, models.AppState.value)).all())
+    except DBAPIError:
+        return {}
+
+def _write_state(conn, key, value):
+    conn.execute(delete(models.AppState).where(models.AppState.key == key))
+    conn.execute(insert(models.AppState).values(key=key, value=str(value)))
+
+def ensure_schema(engine, force: bool = False):
+    # create_all + migrations unless the stored fingerprint matches; -> True when they ran
+    fingerprint = schema_fingerprint()
+    if not force and read_state(engine).get("schema") == fingerprint:
+        return False
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
+    with engine.begin() as conn:
+        _write_state(conn, "schema", fingerprint)
+    return True
+
+def ensure_seed(db, force: bool = False):
+    # crud.seed_data unless this SEED_VERSION was already applied; -> True when it ran
+    if not force and read_state(db.get_bind()).get("seed") == str(SEED_VERSION):
+        return False
+    crud.seed_data(db)
+    _write_state(db, "seed", SEED_VERSION)
+    db.commit()
+    return True
+
+if __name__ == "__main__":
+    import database
+    models.Base.metadata.create_all(bind=database.engine)
+    applied = run_migrations(database.engine)
+    if applied:
+        print(f"Applied migrations: {', '.join(applied)}")
+    else:
+        print("Schema is up to date.")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, Float, Index, UniqueConstraint
 from database import Base
 
 class Staff(Base):
@@ -20,12 +20,18 @@ class CleaningRecord(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     date = Column(String, index=True) # YYYY-MM-DD
+    day = Column(Integer) # date.toordinal() of `date`, used for indexed day/month range scans
     room_id = Column(Integer, index=True) # storing ID, but for simplicity in prototype maybe strictly link? Let's use ID.
-    bed_staff_id = Column(Integer, nullable=True)
-    bath_staff_id = Column(Integer, nullable=True)
+    bed_staff_id = Column(Integer, nullable=True, index=True)
+    bath_staff_id = Column(Integer, nullable=True, index=True)
     towel_count = Column(Integer, default=0)
     status = Column(String, default="draft") # 'draft' or 'locked'
 
+    __table_args__ = (
+        Index("ix_cleaning_records_day_room", "day", "room_id"),
+        {"sqlite_autoincrement": True}, # archived records keep their ids, never hand them out again
+    )
+
 class MonthlyLock(Base):
     __tablename__ = "monthly_locks"
 
@@ -39,3 +45,82 @@ class DailyLock(Base):
     id = Column(Integer, primary_key=True, index=True)
     date = Column(String, unique=True, index=True) # YYYY-MM-DD
     is_locked = Column(Integer, default=0) # 0 for false, 1 for true
+
+class DailyPoints(Base):
+    __tablename__ = "daily_points"
+
+    id = Column(Integer, primary_key=True, index=True)
+    date = Column(String, index=True) # YYYY-MM-DD
+    day = Column(Integer, index=True) # date.toordinal()
+    floor = Column(Integer)
+    room_type = Column(String) # DB, TW, TRP, SW or "D・D" for towel response
+    staff_id = Column(Integer, nullable=True) # NULL when the record had no work assigned
+    is_vendor = Column(Integer, default=0) # 1 for external vendor staff, 0 for in-house
+    points = Column(Float, default=0.0)
+
+    # Rollup key: (date, floor, room type, staff, vendor/in-house flag)
+    __table_args__ = (
+        Index("ix_daily_points_key", "date", "floor", "room_type", "staff_id", "is_vendor"),
+    )
+
+class ArchivedMonth(Base):
+    # Locked month moved out of cleaning_records into a columnar file (see archive.py)
+    __tablename__ = "archived_months"
+
+    year_month = Column(String, primary_key=True) # YYYY-MM
+    start_day = Column(Integer) # [start_day, end_day) as date.toordinal()
+    end_day = Column(Integer)
+    format = Column(String) # "parquet" or "npy"
+    path = Column(String) # .parquet file, or directory of <column>.npy files
+    rows = Column(Integer)
+    created_at = Column(String) # ISO timestamp
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    name = Column(String)
+    applied_at = Column(String) # ISO timestamp
+
+class AppState(Base):
+    # Startup gate: "schema" fingerprint and "seed" version last applied (see migrations.py)
+    __tablename__ = "app_state"
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
+
+class DataVersion(Base):
+    __tablename__ = "data_versions"
+
+    scope = Column(String, primary_key=True) # "date:YYYY-MM-DD", "month:YYYY-MM" or "master"
+    version = Column(Integer, default=0) # bumped in the same transaction as every write to the scope
+
+class ReportSnapshot(Base):
+    __tablename__ = "report_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String, index=True) # "date:YYYY-MM-DD" or "month:YYYY-MM"
+    kind = Column(String) # "vendor" or "monthly"
+    format = Column(String) # "json" or "xlsx"
+    digest = Column(String) # sha256 of the blob stored under snapshots/
+    size = Column(Integer)
+    created_at = Column(String) # ISO timestamp
+
+    __table_args__ = (
+        UniqueConstraint("scope", "kind", "format", name="uq_report_snapshots_key"),
+    )
+
+class ExportJob(Base):
+    __tablename__ = "export_jobs"
+
+    id = Column(String, primary_key=True) # uuid4 hex
+    kind = Column(String) # "vendor", "monthly" or "staff_monthly"
+    params = Column(String) # JSON of the normalized request parameters
+    key = Column(String, index=True) # kind + params + data versions, for dedup
+    status = Column(String, default="pending") # 'pending', 'done' or 'failed'
+    filename = Column(String) # download name
+    path = Column(String) # artifact under EXPORT_DIR
+    size = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(String) # ISO timestamp
+    finished_at = Column(String, nullable=True)
@@ -0,0 +1,296 @@
+import json
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+import master_data, schemas
+
+# OCR rows -> CleaningRecordCreate.
+# The OCR prompt returns rows like {"room": "701", "bed_staff": "Lama", "bath_staff": "Rita", "towel": 0}
+# while staff are stored in katakana. A NameIndex is built once per master-data
+# version (master_data.get_master) and holds, per staff member:
+#   exact     the stored name (NFKC)                              confidence 1.0
+#   katakana  hiragana / half-width / look-alike kanji normalized  0.95
+#   romaji    Hepburn reading of the katakana ("rama", "rita")     0.9
+#   phonetic  l=r, v=b, sh=s, long vowels, final -u dropped        0.85
+#   fuzzy     one edit away on the phonetic key (names of 4+)      0.6
+# A key shared by two staff members resolves to nobody. Each distinct cell
+# value of a page is resolved once, so a page costs a few dict lookups.
+
+CONFIDENCE = {"exact": 1.0, "katakana": 0.95, "romaji": 0.9, "phonetic": 0.85, "fuzzy": 0.6}
+REVIEW_BELOW = 0.8 # rows under this are flagged for the confirmation screen
+
+# Extra spellings that no transliteration produces
+ALIASES = {
+    "自社": ["jisha", "jisya", "inhouse", "in house", "hotel", "self"],
+}
+
+# Kanji / symbols OCR returns in place of katakana that look the same
+LOOKALIKES = str.maketrans({
+    "口": "ロ", "一": "ー", "―": "ー", "‐": "ー", "-": "ー", "二": "ニ", "力": "カ",
+    "工": "エ", "八": "ハ", "卜": "ト", "夕": "タ", "才": "オ", "千": "チ", "三": "ミ",
+})
+# Katakana pairs OCR confuses with each other; folded to one side in the katakana key
+CONFUSABLE = str.maketrans({"ツ": "シ", "ン": "ソ", "ヲ": "ヨ", "ヮ": "ワ"})
+
+_KANA = {
+    "ア": "a", "イ": "i", "ウ": "u", "エ": "e", "オ": "o",
+    "カ": "ka", "キ": "ki", "ク": "ku", "ケ": "ke", "コ": "ko",
+    "ガ": "ga", "ギ": "gi", "グ": "gu", "ゲ": "ge", "ゴ": "go",
+    "サ": "sa", "シ": "shi", "ス": "su", "セ": "se", "ソ": "so",
+    "ザ": "za", "ジ": "ji", "ズ": "zu", "ゼ": "ze", "ゾ": "zo",
+    "タ": "ta", "チ": "chi", "ツ": "tsu", "テ": "te", "ト": "to",
+    "ダ": "da", "ヂ": "ji", "ヅ": "zu", "デ": "de", "ド": "do",
+    "ナ": "na", "ニ": "ni", "ヌ": "nu", "ネ": "ne", "ノ": "no",
+    "ハ": "ha", "ヒ": "hi", "フ": "fu", "ヘ": "he", "ホ": "ho",
+    "バ": "ba", "ビ": "bi", "ブ": "bu", "ベ": "be", "ボ": "bo",
+    "パ": "pa", "ピ": "pi", "プ": "pu", "ペ": "pe", "ポ": "po",
+    "マ": "ma", "ミ": "mi", "ム": "mu", "メ": "me", "モ": "mo",
+    "ヤ": "ya", "ユ": "yu", "ヨ": "yo",
+    "ラ": "ra", "リ": "ri", "ル": "ru", "レ": "re", "ロ": "ro",
+    "ワ": "wa", "ヲ": "o", "ン": "n", "ヴ": "vu",
+    "ァ": "a", "ィ": "i", "ゥ": "u", "ェ": "e", "ォ": "o",
+}
+# Two-kana sounds written with a small kana (ディ, シャ, ファ, ...)
+_DIGRAPHS = {
+    "ディ": "di", "ティ": "ti", "デュ": "dyu", "トゥ": "tu", "ドゥ": "du",
+    "ファ": "fa", "フィ": "fi", "フェ": "fe", "フォ": "fo", "ウィ": "wi", "ウェ": "we", "ウォ": "wo",
+    "ヴァ": "va", "ヴィ": "vi", "ヴェ": "ve", "ヴォ": "vo",
+    "シェ": "she", "ジェ": "je", "チェ": "che",
+}
+for _kana, _head in (("キ", "ky"), ("ギ", "gy"), ("シ", "sh"), ("ジ", "j"), ("チ", "ch"), ("ニ", "ny"),
+                     ("ヒ", "hy"), ("ビ", "by"), ("ピ", "py"), ("ミ", "my"), ("リ", "ry")):
+    for _small, _vowel in (("ャ", "a"), ("ュ", "u"), ("ョ", "o")):
+        _DIGRAPHS[_kana + _small] = _head + _vowel
+
+def _nfkc(value) -> str:
+    return unicodedata.normalize("NFKC", str(value)).strip()
+
+def katakana_key(value) -> str:
+    # Full-width katakana, look-alikes and confusable pairs folded, no spaces / dots
+    text = _nfkc(value).translate(LOOKALIKES)
+    text = "".join(chr(ord(ch) + 0x60) if "ぁ" <= ch <= "ゖ" else ch for ch in text) # hiragana
+    return re.sub(r"[\s・.,、。]", "", text).translate(CONFUSABLE)
+
+def romaji(katakana: str) -> str:
+    out = []
+    i = 0
+    while i < len(katakana):
+        pair = katakana[i:i + 2]
+        if pair in _DIGRAPHS:
+            out.append(_DIGRAPHS[pair])
+            i += 2
+            continue
+        ch = katakana[i]
+        if ch == "ッ": # doubles the next consonant
+            nxt = romaji(katakana[i + 1:i + 3])[:1]
+            out.append(nxt if nxt not in "aeiou" else "")
+        elif ch == "ー": # long vowel: repeat the previous one
+            prev = out[-1][-1:] if out else ""
+            out.append(prev if prev in "aeiou" else "")
+        elif ch in _KANA:
+            out.append(_KANA[ch])
+        elif ch.isascii():
+            out.append(ch.lower())
+        i += 1
+    return "".join(out)
+
+def phonetic_key(text: str) -> str:
+    # Spelling-insensitive key for romaji: "Ramesh", "Lamesu" and ラメス agree
+    key = re.sub(r"[^a-z]", "", _nfkc(text).lower())
+    for a, b in (("sh", "s"), ("ch", "t"), ("ts", "t"), ("ph", "f"), ("l", "r"), ("v", "b"),
+                 ("ee", "i"), ("oo", "u"), ("ou", "o")):
+        key = key.replace(a, b)
+    key = re.sub(r"([a-z])\1+", r"\1", key) # long vowels / doubled consonants
+    key = re.sub(r"h(?=[^aeiou]|$)", "", key) # silent h ("Deepah", "Sitha")
+    if len(key) > 2 and key[-1] in "uo" and key[-2] not in "aeiou":
+        key = key[:-1] # katakana adds a vowel to a final consonant (スニム = sunimu)
+    return key
+
+def _one_edit(a: str, b: str) -> bool:
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return False
+    if len(a) == len(b):
+        return sum(x != y for x, y in zip(a, b)) == 1
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+@dataclass(frozen=True)
+class Match:
+    id: int | None
+    confidence: float
+    method: str | None = None
+
+NO_MATCH = Match(None, 0.0)
+
+class NameIndex:
+    def __init__(self, master):
+        self.master = master
+        self.tables = {method: {} for method in CONFIDENCE if method != "fuzzy"}
+        for s in master.staff:
+            kana = katakana_key(s.name)
+            spellings = [romaji(kana)] + [a for a in ALIASES.get(s.name, []) if a.isascii()]
+            self._add("exact", _nfkc(s.name), s.id)
+            self._add("katakana", kana, s.id)
+            for a in ALIASES.get(s.name, []):
+                self._add("katakana", katakana_key(a), s.id)
+            for spelling in spellings:
+                self._add("romaji", re.sub(r"[^a-z]", "", spelling.lower()), s.id)
+                self._add("phonetic", phonetic_key(spelling), s.id)
+        self.fuzzy = [(key, ids) for key, ids in self.tables["phonetic"].items() if len(ids) == 1 and len(key) >= 4]
+
+        # Rooms: stored number, and the digits of it ("701", "0701" and "701号室" all match)
+        self.rooms = {}
+        for r in master.rooms:
+            for key in {_nfkc(r.number), _digits(r.number)}:
+                if key:
+                    self.rooms.setdefault(key, set()).add(r.id)
+
+    def _add(self, method, key, staff_id):
+        if key:
+            self.tables[method].setdefault(key, set()).add(staff_id)
+
+    def staff(self, value) -> Match:
+        if value is None or str(value).strip() in ("", "-", "ー", "null", "None"):
+            return NO_MATCH
+        text = _nfkc(value)
+        kana = katakana_key(text)
+        latin = re.sub(r"[^a-z]", "", romaji(kana))
+        for method, key in (("exact", text), ("katakana", kana), ("romaji", latin), ("phonetic", phonetic_key(latin))):
+            ids = self.tables[method].get(key)
+            if ids:
+                # Ambiguous keys resolve to nobody rather than to a guess
+                return Match(next(iter(ids)), CONFIDENCE[method], method) if len(ids) == 1 else NO_MATCH
+        key = phonetic_key(latin)
+        if len(key) >= 4:
+            close = {next(iter(ids)) for k, ids in self.fuzzy if _one_edit(key, k)}
+            if len(close) == 1:
+                return Match(close.pop(), CONFIDENCE["fuzzy"], "fuzzy")
+        return NO_MATCH
+
+    def room(self, value) -> Match:
+        if value is None:
+            return NO_MATCH
+        text = _nfkc(value)
+        ids = self.rooms.get(text)
+        if ids is None:
+            # OCR reads O for 0 and l / I for 1 inside numbers
+            ids = self.rooms.get(_digits(text.translate(str.maketrans("OoIl|", "00111"))))
+            method = "digits"
+        else:
+            method = "exact"
+        if not ids or len(ids) > 1:
+            return NO_MATCH
+        return Match(next(iter(ids)), 1.0 if method == "exact" else 0.9, method)
+
+def _digits(value: str) -> str:
+    digits = re.sub(r"\D", "", value)
+    return digits.lstrip("0") or digits
+
+_lock = threading.Lock()
+_index = None
+
+def get_index(db) -> NameIndex:
+    # Rebuilt only when master_data hands out a new MasterData (new version / bind)
+    global _index
+    master = master_data.get_master(db)
+    index = _index
+    if index is not None and index.master is master:
+        return index
+    index = NameIndex(master)
+    with _lock:
+        _index = index
+    return index
+
+# Pages
+
+def parse_rows(text: str):
+    # OCR text -> list of row dicts; tolerates ```json fences and {"rows": [...]}
+    cleaned = re.sub(r"```(?:json)?", "", text or "").strip()
+    try:
+        rows = json.loads(cleaned)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"OCR result is not JSON: {e}")
+    if isinstance(rows, dict):
+        rows = rows.get("rows", [rows])
+    if not isinstance(rows, list):
+        raise ValueError("OCR result is not a list of rows")
+    return [row for row in rows if isinstance(row, dict)]
+
+def _towel(value) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, float)):
+        return int(value > 0)
+    return int(_nfkc(value or "").lower() in ("1", "○", "〇", "◯", "✓", "✔", "yes", "true", "有", "あり"))
+
+FIELDS = {"room": ("room", "room_number"), "bed_staff": ("bed_staff", "bed"), "bath_staff": ("bath_staff", "bath")}
+
+def _field(row, field):
+    # A row's cell under the prompt's key or its alias, None when absent
+    for key in FIELDS[field]:
+        if row.get(key) is not None:
+            return row[key]
+    return None
+
+def resolve_rows(index: NameIndex, date: str, rows):
+    # -> (records, details): records go straight to crud.create_cleaning_records,
+    # details are one dict per input row (ids, confidences, problems)
+    staff_memo = {}
+    records, details, seen = [], [], {}
+
+    def staff(value):
+        key = value if isinstance(value, str) or value is None else str(value)
+        if key not in staff_memo:
+            staff_memo[key] = index.staff(key)
+        return staff_memo[key]
+
+    for i, row in enumerate(rows):
+        cells = {field: _field(row, field) for field in FIELDS}
+        room = index.room(cells["room"])
+        bed = staff(cells["bed_staff"])
+        bath = staff(cells["bath_staff"])
+        problems = []
+        if room.id is None:
+            problems.append("room not found")
+        elif room.id in seen:
+            problems.append(f"duplicate of row {seen[room.id]}")
+        for label, field, match in (("bed", "bed_staff", bed), ("bath", "bath_staff", bath)):
+            value = cells[field]
+            if match.id is None and value not in (None, "", "-"):
+                problems.append(f"{label} staff not found: {value}")
+        # Empty staff cells are fine (not every room has both jobs); unreadable ones are not
+        scores = [room.confidence] + [m.confidence for m, f in ((bed, "bed_staff"), (bath, "bath_staff"))
+                                      if cells[f] not in (None, "", "-")]
+        confidence = round(min(scores), 2)
+        detail = {
+            "row": i,
+            "room": {"value": cells["room"], "id": room.id, "confidence": room.confidence},
+            "bed_staff": {"value": cells["bed_staff"], "id": bed.id, "confidence": bed.confidence, "method": bed.method},
+            "bath_staff": {"value": cells["bath_staff"], "id": bath.id, "confidence": bath.confidence, "method": bath.method},
+            "towel_count": _towel(row.get("towel", 0)),
+            "confidence": confidence,
+            "review": confidence < REVIEW_BELOW or bool(problems),
+            "problems": problems,
+        }
+        details.append(detail)
+        if room.id is not None and room.id not in seen:
+            seen[room.id] = i
+            records.append(schemas.CleaningRecordCreate(
+                date=date, room_id=room.id, bed_staff_id=bed.id, bath_staff_id=bath.id,
+                towel_count=detail["towel_count"],
+            ))
+    return records, details
+
+def resolve_text(index: NameIndex, date: str, text: str):
+    # One page of OCR output -> {"records", "rows", "review"} (or {"error"} when it is not JSON)
+    try:
+        rows = parse_rows(text)
+    except ValueError as e:
+        return {"records": [], "rows": [], "review": 0, "error": str(e)}
+    records, details = resolve_rows(index, date, rows)
+    return {"records": records, "rows": details, "review": sum(d["review"] for d in details)}
@@ -1,41 +1,289 @@
-import google.generativeai as genai
+import asyncio
+import hashlib
+import json
 import os
-from dotenv import load_dotenv
-from typing import Optional
+import random
+import threading
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, replace
 
-load_dotenv()
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+# OCR of daily cleaning sheets.
+# One backend instance (and its API client) is reused for the whole process.
+# Calls are limited by an asyncio semaphore, retried with exponential backoff
+# on transient errors, and cached by the sha256 of the image bytes, so a
+# re-uploaded sheet is answered without another remote call.
+#
+#   OCR_BACKEND      "gemini" (default) or "stub" (offline, deterministic; for tests)
+#   OCR_MODEL        Gemini model name (default gemini-flash-latest)
+#   OCR_CONCURRENCY  max backend calls in flight (default 4)
+#   OCR_RETRIES      retries after a transient failure (default 3)
+#   OCR_TIMEOUT      seconds per backend call (default 60)
+#   OCR_CACHE_SIZE   cached results kept in memory (default 256)
 
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+OCR_BACKEND = os.getenv("OCR_BACKEND", "gemini")
+OCR_MODEL = os.getenv("OCR_MODEL", "gemini-flash-latest")
+OCR_CONCURRENCY = int(os.getenv("OCR_CONCURRENCY", 4))
+OCR_RETRIES = int(os.getenv("OCR_RETRIES", 3))
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", 60))
+OCR_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", 256))
+BACKOFF_BASE = 0.5 # seconds, doubled per attempt (+ jitter)
+
+PROMPT = """
+Analyze this image of a hotel cleaning daily report.
+Extract the following information for each row/room:
+- Room Number (部屋番号)
+- Bed Staff Name (Bed担当者) - if empty or same as single name, infer reasonable default or leave null
+- Bath Staff Name (Bath担当者)
+- Towel Count (タオル) - 1 if circled/checked, 0 if not
+
+Return the result STRICTLY as a JSON array of objects with keys: "room", "bed_staff", "bath_staff", "towel" (0 or 1).
+Example: [{"room": "701", "bed_staff": "Lama", "bath_staff": "Rita", "towel": 0}, ...]
+Do not include markdown formatting like ```json ... ```. just the raw json string.
+"""
+
+class OcrError(Exception):
+    pass
+
+class TransientOcrError(OcrError):
+    # Worth retrying (rate limit, timeout, 5xx)
+    pass
+
+class OcrUnavailable(OcrError):
+    # Backend not configured / not installed
+    pass
+
+class UnsupportedImage(OcrError):
+    pass
+
+@dataclass(frozen=True)
+class OcrResult:
+    text: str
+    digest: str # sha256 of the image bytes
+    mime_type: str
+    backend: str
+    cached: bool = False
+
+# MIME sniffing
+
+def sniff_mime(data: bytes):
+    # Real type from the leading bytes; None when it is not an image we can send
+    data = bytes(data[:16]) # also accepts mmap / memoryview
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[4:8] == b"ftyp" and data[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    if data.startswith(b"%PDF-"):
+        return "application/pdf"
+    return None
+
+# Backends
+
+class OcrBackend:
+    name = "base"
+
+    async def analyze(self, image_bytes: bytes, mime_type: str) -> str:
+        raise NotImplementedError
+
+class GeminiBackend(OcrBackend):
+    name = "gemini"
+
+    def __init__(self, api_key: str = None, model_name: str = None):
+        api_key = api_key or GEMINI_API_KEY
+        if not api_key:
+            raise OcrUnavailable("GEMINI_API_KEY not configured.")
+        try:
+            import google.generativeai as genai
+            from google.api_core import exceptions as api_exceptions
+        except ImportError:
+            raise OcrUnavailable("google-generativeai is not installed.")
+        genai.configure(api_key=api_key)
+        self._model = genai.GenerativeModel(model_name or OCR_MODEL)
+        self._transient = (
+            api_exceptions.ResourceExhausted,
+            api_exceptions.ServiceUnavailable,
+            api_exceptions.DeadlineExceeded,
+            api_exceptions.InternalServerError,
+        )
+        self._api_error = api_exceptions.GoogleAPICallError # PermissionDenied, InvalidArgument, ...
+
+    async def analyze(self, image_bytes: bytes, mime_type: str) -> str:
+        try:
+            response = await self._model.generate_content_async(
+                [PROMPT, {"mime_type": mime_type, "data": bytes(image_bytes)}]
+            )
+        except self._transient as e:
+            raise TransientOcrError(str(e))
+        except self._api_error as e:
+            raise OcrError(f"Gemini request failed: {e}")
+        try:
+            return response.text
+        except ValueError:
+            # No text part: the prompt or the candidate was blocked, or the candidate is empty
+            raise OcrError(f"Gemini returned no text ({self._no_text_reason(response)})")
+
+    @staticmethod
+    def _no_text_reason(response):
+        block = getattr(getattr(response, "prompt_feedback", None), "block_reason", None)
+        if block:
+            return f"prompt blocked: {getattr(block, 'name', block)}"
+        candidates = getattr(response, "candidates", None) or []
+        if not candidates:
+            return "no candidates"
+        finish = getattr(candidates[0], "finish_reason", None)
+        return f"finish reason: {getattr(finish, 'name', finish)}" if finish else "empty candidate"
+
+class StubBackend(OcrBackend):
+    # Offline backend: the same image always yields the same rows
+    name = "stub"
+    STAFF = ["ラマ", "バビタ", "ディパ", "リタ", "リラ", "シタ", "ラメス", "スニム", "ヒマル", "自社"]
+
+    async def analyze(self, image_bytes: bytes, mime_type: str) -> str:
+        rnd = random.Random(hashlib.sha256(image_bytes).digest())
+        floor = rnd.randint(7, 12)
+        rows = [
+            {
+                "room": f"{floor}{i:02d}",
+                "bed_staff": rnd.choice(self.STAFF),
+                "bath_staff": rnd.choice(self.STAFF),
+                "towel": 1 if rnd.random() < 0.1 else 0,
+            }
+            for i in range(1, rnd.randint(5, 20) + 1)
+        ]
+        return json.dumps(rows, ensure_ascii=False)
+
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+}
+
+def register_backend(name: str, factory):
+    BACKENDS[name] = factory
+    set_backend(None)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def set_backend(backend):
+    # Replace the process backend (an OcrBackend instance, or None to rebuild from OCR_BACKEND)
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    _cache.clear()
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            factory = BACKENDS.get(OCR_BACKEND)
+            if factory is None:
+                raise OcrUnavailable(f"Unknown OCR_BACKEND: {OCR_BACKEND}")
+            _backend = factory()
+        return _backend
+
+# Result cache (sha256 -> OcrResult) and in-flight dedup
+
+class _ResultCache:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            result = self._items.get(key)
+            if result is not None:
+                self._items.move_to_end(key)
+            return result
+
+    def put(self, key, result):
+        with self._lock:
+            self._items[key] = result
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+_cache = _ResultCache(OCR_CACHE_SIZE)
+_inflight = {} # (loop, key) -> Future of identical uploads already being analyzed
+_semaphores = weakref.WeakKeyDictionary() # one per event loop
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    sem = _semaphores.get(loop)
+    if sem is None:
+        sem = _semaphores[loop] = asyncio.Semaphore(OCR_CONCURRENCY)
+    return sem
+
+async def _call_with_retry(backend, image_bytes, mime_type):
+    attempt = 0
+    while True:
+        try:
+            async with _semaphore():
+                return await asyncio.wait_for(backend.analyze(image_bytes, mime_type), OCR_TIMEOUT)
+        except (TransientOcrError, asyncio.TimeoutError) as e:
+            if attempt >= OCR_RETRIES:
+                raise TransientOcrError(f"OCR failed after {attempt + 1} attempts: {e or 'timeout'}")
+        delay = BACKOFF_BASE * (2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, delay / 2))
+        attempt += 1
+
+async def analyze(image_bytes: bytes, mime_type: str = None) -> OcrResult:
+    sniffed = sniff_mime(image_bytes)
+    if sniffed is None:
+        raise UnsupportedImage(f"Unsupported image type: {mime_type or 'unknown'}")
+    backend = get_backend()
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    key = (backend.name, digest)
+
+    cached = _cache.get(key)
+    if cached is not None:
+        return replace(cached, cached=True)
+
+    loop = asyncio.get_running_loop()
+    pending = _inflight.get((loop, key))
+    if pending is not None:
+        return replace(await asyncio.shield(pending), cached=True)
+
+    future = loop.create_future()
+    _inflight[(loop, key)] = future
+    try:
+        text = await _call_with_retry(backend, image_bytes, sniffed)
+        result = OcrResult(text=text, digest=digest, mime_type=sniffed, backend=backend.name)
+        _cache.put(key, result)
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception() # mark retrieved when nobody else was waiting
+        raise
+    finally:
+        _inflight.pop((loop, key), None)
 
 def analyze_image(image_bytes: bytes) -> str:
-    if not GEMINI_API_KEY:
-        return "Error: GEMINI_API_KEY not configured."
-    
+    # Blocking helper for scripts; the API uses analyze()
     try:
-        model = genai.GenerativeModel('gemini-flash-latest')
-        
-        # Prepare content parts
-        image_part = {
-            "mime_type": "image/jpeg", # Assuming JPEG for simplicity, or we can detect
-            "data": image_bytes
-        }
-        
-        prompt = """
-        Analyze this image of a hotel cleaning daily report.
-        Extract the following information for each row/room:
-        - Room Number (部屋番号)
-        - Bed Staff Name (Bed担当者) - if empty or same as single name, infer reasonable default or leave null
-        - Bath Staff Name (Bath担当者)
-        - Towel Count (タオル) - 1 if circled/checked, 0 if not
-        
-        Return the result STRICTLY as a JSON array of objects with keys: "room", "bed_staff", "bath_staff", "towel" (0 or 1).
-        Example: [{"room": "701", "bed_staff": "Lama", "bath_staff": "Rita", "towel": 0}, ...]
-        Do not include markdown formatting like ```json ... ```. just the raw json string.
-        """
-        
-        response = model.generate_content([prompt, image_part])
-        return response.text
+        return asyncio.run(analyze(image_bytes)).text
+    except OcrUnavailable as e:
+        return f"Error: {e}"
     except Exception as e:
         return f"Error analyzing image: {str(e)}"
@@ -0,0 +1,148 @@
+import datetime
+from sqlalchemy import select, func, case, literal, union_all, or_
+from fastapi import HTTPException
+import models, master_data, crud, scoring, archive
+
+# Points over a date range as compact time series, aggregated in SQL.
+# cleaning_records is scanned once through the (day, room_id) index, joined to
+# rooms, and the point rules of scoring.py are applied with CASE expressions:
+#   - D・D (towel_count > 0): 1.0, credited to In-House ("自社"); Bed/Bath earn nothing
+#   - otherwise Bed 0.5 + Bath 0.5, credited to the assigned staff
+# Every room and staff member counts (the vendor matrices only show 7F-12F).
+# Archived months (archive.py) have no raw records left; their part is read from
+# the daily_points rollup, which holds the same points per (day, floor, type, staff).
+#
+#   group_by  day (YYYY-MM-DD) | week (Monday, YYYY-MM-DD) | month (YYYY-MM)
+#   split     staff | floor | type (D・D rooms under "D・D")
+
+GROUP_BY = ("day", "week", "month")
+SPLITS = ("staff", "floor", "type")
+MAX_BUCKETS = 3700 # ~10 years of days
+
+def _bucket_column(group_by, table=models.CleaningRecord):
+    if group_by == "day":
+        return table.day
+    if group_by == "week":
+        # Ordinal 1 (0001-01-01) is a Monday, so this is the ordinal of the week's Monday
+        return table.day - (table.day - 1) % 7
+    return func.substr(table.date, 1, 7)
+
+def _bucket_keys(group_by, start_day, end_day):
+    # Every bucket in [start_day, end_day) in order, so series are aligned and zero-filled
+    if group_by == "day":
+        return list(range(start_day, end_day))
+    if group_by == "week":
+        first = start_day - (start_day - 1) % 7
+        return list(range(first, end_day, 7))
+    months = []
+    d = datetime.date.fromordinal(start_day).replace(day=1)
+    while d.toordinal() < end_day:
+        months.append(d.isoformat()[:7])
+        d = (d + datetime.timedelta(days=32)).replace(day=1)
+    return months
+
+def _bucket_label(group_by, key):
+    return key if group_by == "month" else datetime.date.fromordinal(key).isoformat()
+
+def _queries(group_by, split, start_day, end_day, in_house_id):
+    R, Room = models.CleaningRecord, models.Room
+    bucket = _bucket_column(group_by).label("bucket")
+    in_range = (R.day >= start_day, R.day < end_day)
+    is_dd = func.coalesce(R.towel_count, 0) > 0
+
+    if split in ("floor", "type"):
+        # One pass: a record's points do not depend on who did the work
+        points = case(
+            (is_dd, literal(1.0)),
+            else_=case((R.bed_staff_id.isnot(None), 0.5), else_=0.0) + case((R.bath_staff_id.isnot(None), 0.5), else_=0.0),
+        )
+        key = Room.floor if split == "floor" else case((is_dd, literal(scoring.DD)), else_=Room.type)
+        return [
+            select(bucket, key.label("key"), func.sum(points).label("points"))
+            .select_from(R).join(Room, Room.id == R.room_id)
+            .where(*in_range)
+            .group_by(bucket, key)
+        ]
+
+    # Staff: Bed, Bath and D・D credit different people, so one grouped SELECT each
+    def part(staff, points, *where):
+        return (
+            select(bucket, staff.label("key"), (func.count() * points).label("points"))
+            .select_from(R).join(Room, Room.id == R.room_id)
+            .where(*in_range, *where)
+            .group_by(bucket, staff)
+        )
+    return [
+        part(R.bed_staff_id, 0.5, ~is_dd, R.bed_staff_id.isnot(None)),
+        part(R.bath_staff_id, 0.5, ~is_dd, R.bath_staff_id.isnot(None)),
+        part(literal(in_house_id), 1.0, is_dd),
+    ]
+
+def _archived_query(group_by, split, ranges):
+    # Rollup rows of archived days; idle rows (no staff, no D・D) only matter to floor / type
+    P = models.DailyPoints
+    bucket = _bucket_column(group_by, P).label("bucket")
+    key = {"staff": P.staff_id, "floor": P.floor, "type": P.room_type}[split]
+    where = [or_(*[(P.day >= s) & (P.day < e) for s, e in ranges])]
+    if split == "staff":
+        where.append(P.staff_id.isnot(None) | (P.room_type == scoring.DD))
+    return select(bucket, key.label("key"), func.sum(P.points).label("points")).where(*where).group_by(bucket, key)
+
+def get_range_report(db, start: str, end: str, group_by: str = "month", split: str = "staff"):
+    if group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {', '.join(GROUP_BY)}")
+    if split not in SPLITS:
+        raise HTTPException(status_code=400, detail=f"split must be one of {', '.join(SPLITS)}")
+    start_day, end_day = crud.report_day_range(start, end)
+    keys = _bucket_keys(group_by, start_day, end_day)
+    if len(keys) > MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Range too long for group_by={group_by} ({len(keys)} buckets)")
+
+    master = master_data.get_master(db)
+    in_house_id = master.in_house_id if master.in_house_id != -1 else None
+    queries = _queries(group_by, split, start_day, end_day, in_house_id)
+    ranges = [(max(e.start_day, start_day), min(e.end_day, end_day)) for e in archive.entries(db, start_day, end_day)]
+    if ranges:
+        queries.append(_archived_query(group_by, split, ranges))
+    query = queries[0] if len(queries) == 1 else union_all(*queries)
+    rows = db.execute(query).all()
+
+    position = {k: i for i, k in enumerate(keys)}
+    series = {}
+    for bucket, key, points in rows:
+        values = series.get(key)
+        if values is None:
+            values = series[key] = [0.0] * len(keys)
+        values[position[bucket]] += float(points or 0)
+
+    def label(key):
+        if split == "staff":
+            if key is None:
+                return scoring.IN_HOUSE_NAME # D・D with no 自社 staff row
+            staff = master.staff_map.get(key)
+            return staff.name if staff else f"#{key}"
+        return key
+
+    def order(key):
+        if split == "staff":
+            return (0, key) if key in master.staff_map else (1, key or 0)
+        return (key is None, str(key) if split == "type" else (key or 0))
+
+    out = []
+    totals = [0.0] * len(keys)
+    for key in sorted(series, key=order):
+        values = series[key]
+        for i, v in enumerate(values):
+            totals[i] += v
+        out.append({"key": label(key), "id": key if split == "staff" else None,
+                    "points": values, "total": sum(values)})
+    return {
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "split": split,
+        "buckets": [_bucket_label(group_by, k) for k in keys],
+        "series": out,
+        "totals": totals,
+        "total_points": sum(totals),
+    }
@@ -0,0 +1,17 @@
+import models, database, crud
+
+def rebuild():
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        print("Rebuilding daily_points rollup from cleaning_records...")
+        num_rows = crud.rebuild_daily_points(db)
+        print(f"Wrote {num_rows} rollup rows.")
+    except Exception as e:
+        print(f"Error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild()
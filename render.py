@@ -0,0 +1,103 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.encoders import jsonable_encoder
+import crud, scoring, excel_export, cube
+
+# Report rendering for the async request path.
+# Rows are fetched on the async session (crud / scoring inside run_sync), then
+# aggregation, JSON encoding and workbook rendering run on a small dedicated
+# executor. Saves and lock checks stay on the event loop, so a burst of large
+# exports can only queue behind each other, never in front of them.
+# Reports within one month are read from the cached month cube (cube.py).
+
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 2))
+_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+
+async def run(fn, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(fn, *args))
+
+def _frame(layout, start_day, end_day, rows):
+    return scoring.Aggregate(scoring.RecordFrame(layout, start_day, end_day, rows))
+
+def _daily_json(agg):
+    return jsonable_encoder(scoring.daily_view(agg))
+
+def _vendor_json(agg):
+    return jsonable_encoder(scoring.vendor_view(agg))
+
+def _vendor_xlsx(agg):
+    data = scoring.vendor_view(agg)
+    if not data["staff_reports"]:
+        return None
+    return excel_export.stream_workbook(excel_export.vendor_workbook(data))
+
+def _staff_monthly_json(month):
+    return jsonable_encoder(scoring.staff_monthly_view(month.agg))
+
+def _staff_monthly_xlsx(month):
+    data = scoring.staff_monthly_view(month.agg)
+    if not any(s["total_points"] or s["dd_count"] for s in data["staff"]):
+        return None
+    return excel_export.stream_workbook(excel_export.staff_monthly_workbook(data))
+
+def _monthly_json(month):
+    return jsonable_encoder(scoring.monthly_view(cube.monthly_points(month)))
+
+def _monthly_xlsx(month):
+    data = scoring.monthly_view(cube.monthly_points(month))
+    if not data["vendor_monthly"] and not data["hotel_monthly"]:
+        return None
+    return excel_export.stream_workbook(excel_export.monthly_workbook(data))
+
+async def month_cube(db, year_month: str):
+    # Cached cube of the month; on a miss the records are read on the session
+    # and the cube is built on the render executor
+    key, version = await db.run_sync(cube.cache_key, year_month)
+    month = cube.lookup(key, version)
+    if month is None:
+        layout, rows = await db.run_sync(scoring.fetch_records, *crud.month_day_range(year_month))
+        month = await run(cube.build, key, version, layout, rows)
+    return month
+
+async def _records_job(db, start_day, end_day, job):
+    # job(aggregate); ranges inside one month are slices of its cube
+    year_month = cube.month_of(start_day, end_day)
+    if year_month is None:
+        layout, rows = await db.run_sync(scoring.fetch_records, start_day, end_day)
+        return await run(lambda: job(_frame(layout, start_day, end_day, rows)))
+    month = await month_cube(db, year_month)
+    return await run(lambda: job(month.days(start_day, end_day)))
+
+async def _month_job(db, year_month, job):
+    month = await month_cube(db, year_month)
+    return await run(job, month)
+
+async def daily_report(db, date: str):
+    return await _records_job(db, *crud.report_day_range(date), _daily_json)
+
+async def vendor_report(db, date: str, end_date: str = None):
+    return await _records_job(db, *crud.report_day_range(date, end_date), _vendor_json)
+
+async def vendor_workbook(db, date: str, end_date: str = None):
+    # Chunk iterator over the saved .xlsx, or None when there is nothing to export
+    return await _records_job(db, *crud.report_day_range(date, end_date), _vendor_xlsx)
+
+async def staff_monthly_report(db, year_month: str):
+    body = await _month_job(db, year_month, _staff_monthly_json)
+    return {"year_month": year_month, **body}
+
+async def staff_monthly_workbook(db, year_month: str):
+    return await _month_job(db, year_month, _staff_monthly_xlsx)
+
+async def monthly_report(db, year_month: str):
+    return await _month_job(db, year_month, _monthly_json)
+
+async def monthly_workbook(db, year_month: str):
+    return await _month_job(db, year_month, _monthly_xlsx)
+
+async def cube_query(db, year_month: str, by, where, measure: str):
+    month = await month_cube(db, year_month)
+    return await run(cube.query, month, by, where, measure)
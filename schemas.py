@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic import BaseModel
 
 class StaffBase(BaseModel):
@@ -37,6 +38,19 @@ class CleaningRecordBase(BaseModel):
 class CleaningRecordCreate(CleaningRecordBase):
     pass
 
+class OcrResolveRequest(BaseModel):
+    # OCR rows (or the raw OCR text) of one or more pages for a date
+    date: str
+    rows: list[dict] | None = None
+    text: str | None = None
+
+class CleaningRecordPatch(BaseModel):
+    # One changed room cell; all-empty clears the room for that date
+    room_id: int
+    bed_staff_id: int | None = None
+    bath_staff_id: int | None = None
+    towel_count: int = 0
+
 class CleaningRecord(CleaningRecordBase):
     id: int
 
@@ -65,3 +79,10 @@ class DailyLock(DailyLockBase):
 
 class DailyLockUpdate(BaseModel):
     is_locked: int
+
+class ExportJobCreate(BaseModel):
+    # vendor: date, optional end_date for a range; monthly / staff_monthly: year_month
+    kind: Literal["vendor", "monthly", "staff_monthly"]
+    date: str | None = None
+    end_date: str | None = None
+    year_month: str | None = None
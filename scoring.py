@@ -0,0 +1,535 @@
+import datetime
+import numpy as np
+from sqlalchemy import select, func
+import models, master_data, archive
+
+# Single scoring core for the daily, vendor and monthly reports.
+# Records are loaded into columnar arrays, expanded into typed events and
+# counted with one np.bincount over (day, floor, type, staff, kind).
+#
+# Point rules (shared by every report):
+#   - Bed / Bath: 0.5 each, credited to the assigned staff
+#   - D・D (towel_count > 0): 1.0 credited to In-House ("自社"); Bed/Bath on that
+#     room earn no points, a vendor Bed staff only gets a D・D count in its matrix
+
+IN_HOUSE_NAME = "自社"
+DD = "D・D"
+MONTHLY_TYPES = ["DB", "TW", "TRP", "SW"]
+REPORT_FLOORS = [str(f) for f in range(7, 13)] # floors shown in vendor matrices
+
+# Event kinds
+K_ROOM = 0    # one per record (keeps empty days visible)
+K_BED = 1
+K_BATH = 2
+K_BED_DD = 3  # Bed assignment on a D・D room (counted, no points)
+K_BATH_DD = 4
+K_DD = 5      # the D・D itself
+N_KINDS = 6
+
+class Layout:
+    # Array lookups derived from one master-data version
+    def __init__(self, master):
+        self.master = master
+        rooms = master.rooms
+        staff = master.staff
+
+        extra_types = sorted({r.type for r in rooms if r.type not in MONTHLY_TYPES}, key=str)
+        self.types = MONTHLY_TYPES + extra_types
+        type_code = {t: i for i, t in enumerate(self.types)}
+        self.floors = sorted({r.floor for r in rooms if r.floor is not None})
+        floor_code = {f: i for i, f in enumerate(self.floors)}
+
+        self.room_ids = np.array([r.id for r in rooms], dtype=np.int64)
+        self.room_numbers = [r.number for r in rooms]
+        self.room_type = np.array([type_code[r.type] for r in rooms], dtype=np.int64)
+        self.room_floor = np.array([floor_code.get(r.floor, -1) for r in rooms], dtype=np.int64)
+
+        # Staff codes: 0..n-1 known staff, UNKNOWN for ids missing from master, NONE for unassigned
+        self.staff_ids = np.array([s.id for s in staff], dtype=np.int64)
+        self.staff_names = [s.name for s in staff]
+        self.n_known = len(staff)
+        self.UNKNOWN = self.n_known
+        self.NONE = self.n_known + 1
+        self.n_staff = self.n_known + 2
+        self.in_house_id = master.in_house_id
+        self.in_house_code = self.staff_code(np.array([self.in_house_id]))[0] if self.in_house_id != -1 else -1
+
+        # Report names (staff sharing a name share a report); "自社" always exists for D・D
+        self.names = list(dict.fromkeys(self.staff_names + [IN_HOUSE_NAME]))
+        name_code = {n: i for i, n in enumerate(self.names)}
+        self.staff_name_code = np.array([name_code[n] for n in self.staff_names], dtype=np.int64)
+        self.in_house_name_code = name_code[IN_HOUSE_NAME]
+
+    def staff_code(self, ids):
+        # Vectorized id -> code; 0 maps to NONE
+        codes = np.full(len(ids), self.UNKNOWN, dtype=np.int64)
+        if self.n_known:
+            pos = np.searchsorted(self.staff_ids, ids).clip(0, self.n_known - 1)
+            found = self.staff_ids[pos] == ids
+            codes[found] = pos[found]
+        codes[ids == 0] = self.NONE
+        return codes
+
+_layout = None
+
+def get_layout(master):
+    global _layout
+    if _layout is None or _layout.master is not master:
+        _layout = Layout(master)
+    return _layout
+
+class RecordFrame:
+    # Columnar cleaning records joined to rooms; records of unknown rooms are dropped
+    def __init__(self, layout, start_day, end_day, rows):
+        self.layout = layout
+        # Plain tuples first: numpy is far slower unpacking SQLAlchemy Row objects
+        if isinstance(rows, np.ndarray):
+            cols = rows.reshape(-1, 5)
+        else:
+            cols = np.array(list(map(tuple, rows)), dtype=np.int64).reshape(-1, 5)
+        day, room_id, bed, bath, towel = cols.T
+
+        if len(layout.room_ids):
+            pos = np.searchsorted(layout.room_ids, room_id).clip(0, len(layout.room_ids) - 1)
+            known = layout.room_ids[pos] == room_id
+        else:
+            pos = np.zeros(len(room_id), dtype=np.int64)
+            known = np.zeros(len(room_id), dtype=bool)
+
+        self.room = pos[known]
+        self.day = day[known]
+        self.bed = bed[known]
+        self.bath = bath[known]
+        self.towel = towel[known]
+        self.floor = layout.room_floor[self.room]
+        self.type = layout.room_type[self.room]
+
+        if start_day is None:
+            start_day = int(self.day.min()) if len(self.day) else 0
+            end_day = int(self.day.max()) + 1 if len(self.day) else 0
+        self.start_day = start_day
+        self.end_day = end_day
+
+    def __len__(self):
+        return len(self.day)
+
+    def days(self, start_day, end_day, keep):
+        # Records of [start_day, end_day), keep: their boolean mask
+        sub = object.__new__(RecordFrame)
+        sub.layout = self.layout
+        for name in ("room", "day", "bed", "bath", "towel", "floor", "type"):
+            setattr(sub, name, getattr(self, name)[keep])
+        sub.start_day = start_day
+        sub.end_day = end_day
+        return sub
+
+def fetch_records(db, start_day=None, end_day=None):
+    # DB half of load_records: (layout, plain row tuples), RecordFrame is built by the caller.
+    # Archived months are read from their columnar files (rows then come as one int64 array).
+    R = models.CleaningRecord
+    columns = [
+        R.day, R.room_id,
+        func.coalesce(R.bed_staff_id, 0), func.coalesce(R.bath_staff_id, 0), func.coalesce(R.towel_count, 0)
+    ]
+    archived = archive.read_records(db, start_day, end_day)
+    if archived is not None:
+        columns.insert(0, R.id)
+    query = select(*columns).where(R.day.isnot(None))
+    if start_day is not None:
+        query = query.where(R.day >= start_day, R.day < end_day)
+    rows = list(map(tuple, db.execute(query.order_by(R.id)).all()))
+    layout = get_layout(master_data.get_master(db))
+    if archived is None:
+        return layout, rows
+    hot = np.array(rows, dtype=np.int64).reshape(-1, 6)
+    merged = np.concatenate([archived, hot])
+    merged = merged[np.argsort(merged[:, 0], kind="stable")]
+    return layout, np.ascontiguousarray(merged[:, 1:])
+
+def load_records(db, start_day=None, end_day=None):
+    # [start_day, end_day) by integer day; no bounds loads every dated record
+    layout, rows = fetch_records(db, start_day, end_day)
+    return RecordFrame(layout, start_day, end_day, rows)
+
+class Events:
+    # One row per scoring event, ordered by (record, room/D・D/Bed/Bath)
+    def __init__(self, frame):
+        layout = frame.layout
+        n = len(frame)
+        rec = np.arange(n)
+        is_dd = frame.towel > 0
+        has_bed = frame.bed != 0
+        has_bath = frame.bath != 0
+
+        parts = [
+            (rec, 0, np.full(n, K_ROOM), np.zeros(n, dtype=np.int64)),
+            (rec[is_dd], 1, np.full(int(is_dd.sum()), K_DD), np.zeros(int(is_dd.sum()), dtype=np.int64)),
+            (rec[has_bed], 2, np.where(is_dd[has_bed], K_BED_DD, K_BED), frame.bed[has_bed]),
+            (rec[has_bath], 3, np.where(is_dd[has_bath], K_BATH_DD, K_BATH), frame.bath[has_bath]),
+        ]
+        rec_idx = np.concatenate([p[0] for p in parts])
+        sub = np.concatenate([np.full(len(p[0]), p[1]) for p in parts])
+        order = np.lexsort((sub, rec_idx))
+
+        self.rec = rec_idx[order]
+        self.kind = np.concatenate([p[2] for p in parts])[order].astype(np.int64)
+        self.staff_id = np.concatenate([p[3] for p in parts])[order]
+        self.staff = layout.staff_code(self.staff_id)
+        self.day = frame.day[self.rec]
+        self.floor = frame.floor[self.rec]
+        self.type = frame.type[self.rec]
+        self.room = frame.room[self.rec]
+        # Towels are credited to the Bed staff
+        self.towel = np.where(self.kind == K_BED_DD, frame.towel[self.rec], 0)
+
+    def subset(self, keep, rec_keep):
+        # Events of the records in rec_keep (mask over the frame), order unchanged
+        sub = object.__new__(Events)
+        for name in ("kind", "staff_id", "staff", "day", "floor", "type", "room", "towel"):
+            setattr(sub, name, getattr(self, name)[keep])
+        sub.rec = (np.cumsum(rec_keep) - 1)[self.rec[keep]]
+        return sub
+
+class Aggregate:
+    # Dense counts[day, floor, type, staff, kind] from a single bincount,
+    # plus towels credited per staff
+    def __init__(self, frame):
+        layout = frame.layout
+        self.frame = frame
+        self.layout = layout
+        self.events = ev = Events(frame)
+
+        self.shape = (
+            max(frame.end_day - frame.start_day, 0),
+            len(layout.floors) + 1, # last slot: rooms without a floor
+            len(layout.types),
+            layout.n_staff,
+            N_KINDS,
+        )
+        floor = np.where(ev.floor < 0, len(layout.floors), ev.floor)
+        key = np.ravel_multi_index((ev.day - frame.start_day, floor, ev.type, ev.staff, ev.kind), self.shape)
+        size = int(np.prod(self.shape))
+        self.counts = np.bincount(key, minlength=size).reshape(self.shape)
+        self.towels = np.bincount(ev.staff, weights=ev.towel, minlength=layout.n_staff)
+
+    def days(self, start_day, end_day):
+        # Sub-aggregate of [start_day, end_day) inside the frame, without re-counting:
+        # every view gives the same result as aggregating that range directly
+        frame = self.frame
+        if (start_day, end_day) == (frame.start_day, frame.end_day):
+            return self
+        assert frame.start_day <= start_day < end_day <= frame.end_day
+        rec_keep = (frame.day >= start_day) & (frame.day < end_day)
+        ev_keep = rec_keep[self.events.rec]
+        sub = object.__new__(Aggregate)
+        sub.layout = self.layout
+        sub.frame = frame.days(start_day, end_day, rec_keep)
+        sub.events = ev = self.events.subset(ev_keep, rec_keep)
+        sub.counts = self.counts[start_day - frame.start_day:end_day - frame.start_day]
+        sub.shape = sub.counts.shape
+        sub.towels = np.bincount(ev.staff, weights=ev.towel, minlength=self.layout.n_staff)
+        return sub
+
+def aggregate(db, start_day, end_day):
+    return Aggregate(load_records(db, start_day, end_day))
+
+def daily_view(agg):
+    layout = agg.layout
+    # [type, staff] over all days and floors
+    c = agg.counts.sum(axis=(0, 1))
+    bed = c[:, :, K_BED] + c[:, :, K_BED_DD]
+    bath = c[:, :, K_BATH] + c[:, :, K_BATH_DD]
+    towel = agg.towels
+
+    report = {}
+    for name in layout.staff_names:
+        report[name] = {"bed": {}, "bath": {}, "towel": 0}
+
+    for code, name in enumerate(layout.staff_names):
+        entry = report[name]
+        for t in np.flatnonzero(bed[:, code]):
+            entry["bed"][layout.types[t]] = entry["bed"].get(layout.types[t], 0) + int(bed[t, code])
+        for t in np.flatnonzero(bath[:, code]):
+            entry["bath"][layout.types[t]] = entry["bath"].get(layout.types[t], 0) + int(bath[t, code])
+        entry["towel"] += int(towel[code])
+    return report
+
+def _empty_total_matrix():
+    return { f: {"DB": 0.0, "TW": 0.0, "TRP": 0.0, "SW": 0.0, DD: 0.0, "Total": 0.0} for f in REPORT_FLOORS }
+
+def vendor_view(agg):
+    layout = agg.layout
+    ev = agg.events
+    types = layout.types
+    n_names = len(layout.names)
+
+    # Matrix floors only (7F-12F)
+    floor_slots = [layout.floors.index(int(f)) if int(f) in layout.floors else None for f in REPORT_FLOORS]
+    c = agg.counts.sum(axis=0) # [floor, type, staff, kind]
+    known = slice(0, layout.n_known)
+
+    # Per report name: Bed/Bath counts [name, floor, type], D・D column [name, floor]
+    work = np.zeros((n_names, len(REPORT_FLOORS), len(types)), dtype=np.int64)
+    dd_col = np.zeros((n_names, len(REPORT_FLOORS)), dtype=np.int64)
+    dd_pts = np.zeros((n_names, len(REPORT_FLOORS)), dtype=np.int64)
+    not_in_house = np.arange(layout.n_known) != layout.in_house_code
+    for i, slot in enumerate(floor_slots):
+        if slot is None: continue
+        bb = (c[slot, :, known, K_BED] + c[slot, :, known, K_BATH]).T # [staff, type]
+        np.add.at(work[:, i, :], layout.staff_name_code, bb)
+        marks = c[slot, :, known, K_BED_DD].sum(axis=0) * not_in_house
+        np.add.at(dd_col[:, i], layout.staff_name_code, marks)
+        dd = int(c[slot, :, :, K_DD].sum())
+        dd_col[layout.in_house_name_code, i] += dd
+        dd_pts[layout.in_house_name_code, i] += dd
+
+    # Report order follows first appearance in the record stream
+    in_matrix = np.isin(ev.floor, [s for s in floor_slots if s is not None])
+    report_name = np.full(len(ev.kind), -1, dtype=np.int64)
+    staff_known = ev.staff < layout.n_known
+    name_of = np.zeros(len(ev.kind), dtype=np.int64)
+    name_of[staff_known] = layout.staff_name_code[ev.staff[staff_known]]
+    scoring_work = (ev.kind == K_BED) | (ev.kind == K_BATH)
+    report_name[scoring_work & staff_known] = name_of[scoring_work & staff_known]
+    mark = (ev.kind == K_BED_DD) & staff_known & (ev.staff != layout.in_house_code)
+    report_name[mark] = name_of[mark]
+    report_name[ev.kind == K_DD] = layout.in_house_name_code
+    report_name[~in_matrix] = -1
+    has_report = report_name >= 0
+    names_in_order, first = np.unique(report_name[has_report], return_index=True)
+    names_in_order = names_in_order[np.argsort(first)]
+
+    staff_reports = {}
+    for n in names_in_order:
+        matrix = {}
+        total_points = 0.0
+        for i, f in enumerate(REPORT_FLOORS):
+            cell = {DD: float(dd_col[n, i]), "Total": 0.0}
+            for t in np.flatnonzero(work[n, i]):
+                cell[types[t]] = work[n, i, t] * 0.5
+            cell["Total"] = work[n, i].sum() * 0.5 + float(dd_pts[n, i])
+            total_points += cell["Total"]
+            matrix[f] = cell
+        staff_reports[layout.names[n]] = {"matrix": matrix, "details": [], "total_points": total_points}
+
+    # Details: one accumulator per (report, day, room); a second Bed/Bath on the
+    # same key makes it "Full". D・D rows stay one per room. Rows keep the order
+    # in which their first event appears, so the output is stable for the same data.
+    scored = has_report & ((ev.kind == K_BED) | (ev.kind == K_BATH))
+    scored_idx = np.flatnonzero(scored)
+    keys = np.stack([report_name[scored], ev.day[scored], ev.room[scored]])
+    if keys.shape[1]:
+        _, first, counts = np.unique(keys, axis=1, return_index=True, return_counts=True)
+        group_pos = scored_idx[first]
+    else:
+        group_pos = counts = np.zeros(0, dtype=np.int64)
+    dd_pos = np.flatnonzero(has_report & (ev.kind == K_DD))
+
+    pos = np.concatenate([group_pos, dd_pos])
+    n_work = np.concatenate([counts, np.zeros(len(dd_pos), dtype=np.int64)])
+    order = np.argsort(pos, kind="stable")
+
+    multi_day = agg.frame.end_day - agg.frame.start_day > 1
+    room_numbers = layout.room_numbers
+    report_list = {n: staff_reports[layout.names[n]]["details"] for n in names_in_order}
+    for k, n in zip(pos[order].tolist(), n_work[order].tolist()):
+        if n == 0:
+            work_label, pts = DD, 1.0
+        elif n > 1:
+            work_label, pts = "Full", 0.5 * n
+        else:
+            work_label, pts = ("Bed only" if ev.kind[k] == K_BED else "Bath only"), 0.5
+        detail = {"room": room_numbers[ev.room[k]], "type": types[ev.type[k]], "work": work_label, "points": pts}
+        if multi_day:
+            detail["date"] = datetime.date.fromordinal(int(ev.day[k])).isoformat()
+        report_list[report_name[k]].append(detail)
+
+    # Aggregate Matrices
+    vendor_total = _empty_total_matrix()
+    in_house_total = _empty_total_matrix()
+    hotel_total = _empty_total_matrix()
+    v_pts = 0.0
+    i_pts = 0.0
+    h_pts = 0.0
+
+    for s_name, rep in staff_reports.items():
+        is_vendor = (s_name != IN_HOUSE_NAME)
+        for f, stats in rep["matrix"].items():
+            for t, val in stats.items():
+                if t == "Total": continue
+                # Hotel sums every column; Vendor / In-House split by report name
+                for target in (hotel_total, vendor_total if is_vendor else in_house_total):
+                    target[f][t] = target[f].get(t, 0.0) + val
+                    target[f]["Total"] += val
+        h_pts += rep["total_points"]
+        if is_vendor:
+            v_pts += rep["total_points"]
+        else:
+            i_pts += rep["total_points"]
+
+    return {
+        "staff_reports": staff_reports,
+        "vendor_total": {"matrix": vendor_total, "total_points": v_pts},
+        "in_house_total": {"matrix": in_house_total, "total_points": i_pts},
+        "hotel_total": {"matrix": hotel_total, "total_points": h_pts}
+    }
+
+def staff_monthly_view(agg):
+    # Per report name over the whole frame (every floor): points per day / room type / floor,
+    # Full / Bed only / Bath only room counts and D・D counts, from the one bincount
+    layout = agg.layout
+    ev = agg.events
+    frame = agg.frame
+    n_names = len(layout.names)
+    known = slice(0, layout.n_known)
+    c = agg.counts # [day, floor, type, staff, kind]
+
+    # Staff -> report name as a one-hot matrix, so every split is one matmul
+    to_name = np.zeros((layout.n_known, n_names), dtype=np.int64)
+    to_name[np.arange(layout.n_known), layout.staff_name_code] = 1
+
+    # Bed/Bath halves [day, floor, type, name]; D・D (1.0, two halves) goes to 自社
+    work = (c[:, :, :, known, K_BED] + c[:, :, :, known, K_BATH]) @ to_name
+    dd = c[:, :, :, :, K_DD].sum(axis=3) # [day, floor, type]
+    by_type = np.zeros((n_names, len(layout.types) + 1)) # last column: D・D
+    by_type[:, :-1] = work.sum(axis=(0, 1)).T / 2
+    by_type[layout.in_house_name_code, -1] = dd.sum()
+    halves = work.copy()
+    halves[..., layout.in_house_name_code] += 2 * dd
+
+    daily = halves.sum(axis=(1, 2)).T / 2 # [name, day]
+    by_floor = halves.sum(axis=(0, 2)).T / 2 # [name, floor slot]
+
+    # D・D counts: a vendor Bed staff is marked once per D・D room, 自社 gets every D・D
+    not_in_house = np.arange(layout.n_known) != layout.in_house_code
+    dd_count = (c[:, :, :, known, K_BED_DD].sum(axis=(0, 1, 2)) * not_in_house) @ to_name
+    dd_count[layout.in_house_name_code] += int(dd.sum())
+
+    # Full / Bed only / Bath only per (name, day, room), as in the vendor details
+    full = np.zeros(n_names, dtype=np.int64)
+    bed_only = np.zeros(n_names, dtype=np.int64)
+    bath_only = np.zeros(n_names, dtype=np.int64)
+    scored = ((ev.kind == K_BED) | (ev.kind == K_BATH)) & (ev.staff < layout.n_known)
+    if scored.any():
+        names = layout.staff_name_code[ev.staff[scored]]
+        keys = np.stack([names, ev.day[scored], ev.room[scored]])
+        uniq, first, counts = np.unique(keys, axis=1, return_index=True, return_counts=True)
+        single = counts == 1
+        first_kind = ev.kind[scored][first]
+        np.add.at(full, uniq[0][~single], 1)
+        np.add.at(bed_only, uniq[0][single & (first_kind == K_BED)], 1)
+        np.add.at(bath_only, uniq[0][single & (first_kind == K_BATH)], 1)
+
+    floor_labels = [str(f) for f in layout.floors]
+    type_labels = layout.types + [DD]
+    staff = []
+    totals = {"vendor": 0.0, "in_house": 0.0, "hotel": 0.0}
+    for n, name in enumerate(layout.names):
+        total = float(daily[n].sum())
+        is_vendor = name != IN_HOUSE_NAME
+        staff.append({
+            "name": name,
+            "is_vendor": is_vendor,
+            "daily_points": [float(v) for v in daily[n]],
+            "by_type": {t: float(by_type[n, i]) for i, t in enumerate(type_labels)},
+            "by_floor": {f: float(by_floor[n, i]) for i, f in enumerate(floor_labels)},
+            "work": {"Full": int(full[n]), "Bed only": int(bed_only[n]), "Bath only": int(bath_only[n])},
+            "dd_count": int(dd_count[n]),
+            "total_points": total,
+        })
+        totals["vendor" if is_vendor else "in_house"] += total
+        totals["hotel"] += total
+
+    return {
+        "days": [datetime.date.fromordinal(d).isoformat() for d in range(frame.start_day, frame.end_day)],
+        "types": type_labels,
+        "floors": floor_labels,
+        "staff": staff,
+        "totals": totals,
+    }
+
+def daily_points_rows(frame):
+    # Rollup rows keyed by (day, floor, room type, staff, vendor flag), see models.DailyPoints
+    layout = frame.layout
+    ev = Events(frame)
+    dd_type = len(layout.types)
+    in_house_id = layout.in_house_id
+
+    rec_worked = np.zeros(len(frame), dtype=bool)
+    scored = (ev.kind == K_BED) | (ev.kind == K_BATH)
+    rec_worked[ev.rec[scored]] = True
+    idle = (ev.kind == K_ROOM) & ~rec_worked[ev.rec] & ~(frame.towel[ev.rec] > 0)
+    dd = ev.kind == K_DD
+
+    keep = scored | idle | dd
+    staff_id = np.where(dd, max(in_house_id, 0), ev.staff_id)
+    is_vendor = (scored & (ev.staff_id != in_house_id)).astype(np.int64)
+    r_type = np.where(dd, dd_type, ev.type)
+    halves = np.where(dd, 2, np.where(scored, 1, 0))
+
+    # Floor slot, -1 when the room has no floor
+    keys = np.stack([ev.day, ev.floor, r_type, staff_id, is_vendor])[:, keep]
+    if not keys.shape[1]:
+        return []
+    uniq, inverse = np.unique(keys, axis=1, return_inverse=True)
+    points = np.bincount(inverse.ravel(), weights=halves[keep]) / 2
+
+    floor_by_slot = {i: f for i, f in enumerate(layout.floors)}
+    type_names = layout.types + [DD]
+    rows = []
+    for (day, slot, t, s, v), pts in zip(uniq.T.tolist(), points.tolist()):
+        rows.append({
+            "date": datetime.date.fromordinal(day).isoformat(),
+            "day": day,
+            "floor": floor_by_slot.get(slot),
+            "room_type": type_names[t],
+            "staff_id": s or None,
+            "is_vendor": v,
+            "points": pts,
+        })
+    return rows
+
+def load_points(db, start_day, end_day):
+    P = models.DailyPoints
+    return db.execute(
+        select(P.day, P.room_type, P.is_vendor, P.points)
+        .where(P.day >= start_day, P.day < end_day)
+    ).all()
+
+def monthly_view(points_rows):
+    # points_rows: (day, room_type, is_vendor, points) from the daily_points rollup
+    vendor_monthly = {} # Only DB/TW/TRP/SW, external staff
+    hotel_monthly = {}  # DB/TW/TRP/SW/D・D, all staff
+    if not points_rows:
+        return {"vendor_monthly": vendor_monthly, "hotel_monthly": hotel_monthly}
+
+    cols = MONTHLY_TYPES + [DD]
+    col_code = {t: i for i, t in enumerate(cols)}
+    day = np.array([r[0] for r in points_rows], dtype=np.int64)
+    col = np.array([col_code.get(r[1], -1) for r in points_rows], dtype=np.int64)
+    is_vendor = np.array([bool(r[2]) for r in points_rows])
+    points = np.array([r[3] or 0.0 for r in points_rows], dtype=np.float64)
+
+    days, day_idx = np.unique(day, return_inverse=True)
+    counted = col >= 0
+    shape = (len(days), len(cols))
+    hotel = np.zeros(shape)
+    np.add.at(hotel, (day_idx[counted], col[counted]), points[counted])
+    # Vendor Monthly EXCLUDES D・D points
+    v_mask = counted & is_vendor & (col != col_code[DD])
+    vendor = np.zeros(shape)
+    np.add.at(vendor, (day_idx[v_mask], col[v_mask]), points[v_mask])
+
+    for i, d in enumerate(days.tolist()):
+        dd_str = datetime.date.fromordinal(d).isoformat().split("-")[-1] # "DD"
+        v = {t: float(vendor[i, j]) for j, t in enumerate(MONTHLY_TYPES)}
+        v["Total"] = float(vendor[i, :len(MONTHLY_TYPES)].sum())
+        h = {t: float(hotel[i, j]) for j, t in enumerate(cols)}
+        h["Total"] = float(hotel[i].sum())
+        vendor_monthly[dd_str] = v
+        hotel_monthly[dd_str] = h
+
+    return {
+        "vendor_monthly": vendor_monthly,
+        "hotel_monthly": hotel_monthly
+    }
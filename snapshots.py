@@ -0,0 +1,95 @@
+import datetime
+import hashlib
+import os
+import tempfile
+import time
+import models
+
+# Immutable report snapshots for locked days / months.
+# Blobs are content-addressed files (snapshots/ab/<sha256>.<ext>); the
+# report_snapshots table maps (scope, kind, format) to a digest. Rows are
+# written in the caller's transaction, blobs are written before it commits,
+# so a failed commit can only leave an unreferenced blob behind (see prune()).
+# A blob is only pruned once it is older than SNAPSHOT_PRUNE_GRACE: until then it may
+# belong to a capture that has not committed yet.
+
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "./snapshots")
+SNAPSHOT_PRUNE_GRACE = int(os.environ.get("SNAPSHOT_PRUNE_GRACE", 600)) # seconds
+
+def blob_path(digest: str, fmt: str):
+    return os.path.join(SNAPSHOT_DIR, digest[:2], f"{digest}.{fmt}")
+
+def _write_blob(data: bytes, fmt: str):
+    digest = hashlib.sha256(data).hexdigest()
+    path = blob_path(digest, fmt)
+    if os.path.exists(path):
+        os.utime(path) # reused by this capture: keep it out of a concurrent prune()
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+    return digest
+
+def store(db, scope: str, kind: str, fmt: str, data: bytes):
+    # Does not commit
+    digest = _write_blob(data, fmt)
+    snap = find(db, scope, kind, fmt)
+    if snap is None:
+        snap = models.ReportSnapshot(scope=scope, kind=kind, format=fmt)
+        db.add(snap)
+    snap.digest = digest
+    snap.size = len(data)
+    snap.created_at = datetime.datetime.now().isoformat(timespec="seconds")
+    return snap
+
+def find(db, scope: str, kind: str, fmt: str):
+    return db.query(models.ReportSnapshot).filter(
+        models.ReportSnapshot.scope == scope,
+        models.ReportSnapshot.kind == kind,
+        models.ReportSnapshot.format == fmt,
+    ).first()
+
+def locate(db, scope: str, kind: str, fmt: str):
+    # Path of a stored blob, or None (no snapshot or blob lost -> recompute)
+    snap = find(db, scope, kind, fmt)
+    if snap is None:
+        return None
+    path = blob_path(snap.digest, fmt)
+    return (snap.digest, path) if os.path.exists(path) else None
+
+def drop(db, scopes=None):
+    # Does not commit; scopes=None drops every snapshot
+    q = db.query(models.ReportSnapshot)
+    if scopes is not None:
+        q = q.filter(models.ReportSnapshot.scope.in_(list(scopes)))
+    q.delete(synchronize_session=False)
+
+def prune(db):
+    # Remove blobs no longer referenced by any snapshot (call after commit); in-flight
+    # .tmp files and blobs younger than the grace period are left alone
+    if not os.path.isdir(SNAPSHOT_DIR):
+        return 0
+    cutoff = time.time() - SNAPSHOT_PRUNE_GRACE
+    live = {d for (d,) in db.query(models.ReportSnapshot.digest).all()}
+    removed = 0
+    for sub in os.listdir(SNAPSHOT_DIR):
+        folder = os.path.join(SNAPSHOT_DIR, sub)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            if name.endswith(".tmp") or name.split(".")[0] in live:
+                continue
+            path = os.path.join(folder, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass # removed by a concurrent prune()
+    return removed
@@ -2,6 +2,7 @@ import requests
 import sys
 
 BASE_URL = "http://127.0.0.1:8000/api"
+# Start the server with OCR_BACKEND=stub to run this offline (no Gemini key needed)
 
 def test_analyze_endpoint():
     print("Testing Image Analysis Endpoint...")
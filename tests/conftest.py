@@ -0,0 +1,34 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The app reads its database / storage locations at import time: point them at a
+# scratch directory before anything imports main. The top-level test_*.py files are
+# scripts against a running server; these tests run the app in-process.
+_work = tempfile.mkdtemp(prefix="hotel-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_work, 'test.db')}"
+for _name in ("ARCHIVE_DIR", "EXPORT_DIR", "SNAPSHOT_DIR", "UPLOAD_DIR"):
+    os.environ[_name] = os.path.join(_work, _name.split("_")[0].lower())
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as c:
+        yield c
+
+@pytest.fixture(scope="session")
+def rooms(client):
+    return client.get("/api/rooms").json()
+
+@pytest.fixture(scope="session")
+def staff(client):
+    return client.get("/api/staff").json()
+
+@pytest.fixture
+def db(client):
+    import database
+    with database.SessionLocal() as session:
+        yield session
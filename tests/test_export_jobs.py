@@ -0,0 +1,29 @@
+import io
+import time
+import openpyxl
+
+def _wait(client, job):
+    for _ in range(300):
+        status = client.get(f"/api/exports/{job['id']}").json()
+        if status["status"] != "pending":
+            return status
+        time.sleep(0.1)
+    raise AssertionError(f"export job {job['id']} did not finish")
+
+def _export_names(client, year_month):
+    status = _wait(client, client.post("/api/exports", json={"kind": "staff_monthly", "year_month": year_month}).json())
+    assert status["status"] == "done", status["error"]
+    wb = openpyxl.load_workbook(io.BytesIO(client.get(status["download_url"]).content), read_only=True)
+    return {cell for ws in wb.worksheets for row in ws.iter_rows(values_only=True) for cell in row}
+
+def test_export_job_sees_staff_added_after_worker_start(client, rooms, staff):
+    records = [{"date": "2025-05-01", "room_id": rooms[0]["id"], "bed_staff_id": staff[0]["id"]}]
+    assert client.post("/api/records?date=2025-05-01", json=records).status_code == 200
+    # First job starts the worker and fills its master data cache
+    assert staff[0]["name"] in _export_names(client, "2025-05")
+
+    new = client.post("/api/staff", json={"name": "テスト追加スタッフ"}).json()
+    records.append({"date": "2025-05-02", "room_id": rooms[1]["id"], "bed_staff_id": new["id"], "bath_staff_id": new["id"]})
+    assert client.patch("/api/records/2025-05-02", json=records[1:]).status_code == 200
+
+    assert "テスト追加スタッフ" in _export_names(client, "2025-05")
@@ -0,0 +1,24 @@
+import master_data, ocr_resolver
+
+def _index():
+    staff = [master_data.StaffRow(i + 1, name) for i, name in enumerate(["ラマ", "リタ", "自社"])]
+    rooms = [master_data.RoomRow(1, "701", "DB", 7), master_data.RoomRow(2, "702", "TW", 7)]
+    return ocr_resolver.NameIndex(master_data.MasterData(1, None, rooms, staff))
+
+def test_alias_keys_are_checked_like_prompt_keys():
+    rows = [
+        {"room": "701", "bed_staff": "Lama", "bath_staff": "Rita"},
+        {"room_number": "702", "bed": "Lama", "bath": "Nobody"},
+    ]
+    records, details = ocr_resolver.resolve_rows(_index(), "2025-03-01", rows)
+    assert [(r.room_id, r.bed_staff_id, r.bath_staff_id) for r in records] == [(1, 1, 2), (2, 1, None)]
+    alias = details[1]
+    assert alias["room"]["value"] == "702" and alias["bed_staff"]["value"] == "Lama"
+    assert alias["problems"] == ["bath staff not found: Nobody"]
+    assert alias["review"]
+
+def test_resolve_endpoint_rejects_a_missing_date(client):
+    rows = [{"room": "701", "bed_staff": "ラマ"}]
+    assert client.post("/api/ocr/resolve", json={"date": "", "rows": rows}).status_code == 400
+    assert client.post("/api/ocr/resolve", json={"date": "2025-13-01", "rows": rows}).status_code == 400
+    assert client.post("/api/ocr/resolve", json={"date": "2025-03-01", "rows": rows}).status_code == 200
@@ -0,0 +1,108 @@
+import io
+import json
+import random
+import pytest
+import models, crud, schemas, scoring, cube, archive, backup, range_report
+
+# Seeded random months, checked across the report paths: the cube against a direct
+# scoring aggregate, the SQL range report against the staff statement, and a backup
+# round-trip with one month archived.
+
+MONTHS = {"2024-01": 31, "2024-02": 29, "2024-03": 31}
+
+@pytest.fixture(scope="module")
+def seeded(client):
+    import database
+    rnd = random.Random(7)
+    with database.SessionLocal() as db:
+        rooms = db.query(models.Room).all()
+        staff = [s.id for s in db.query(models.Staff).all()]
+        for year_month, days in MONTHS.items():
+            for d in range(1, days + 1):
+                if rnd.random() < 0.2:
+                    continue
+                date = f"{year_month}-{d:02d}"
+                records = [
+                    schemas.CleaningRecordCreate(
+                        date=date, room_id=room.id,
+                        bed_staff_id=rnd.choice([None] + staff),
+                        bath_staff_id=rnd.choice([None] + staff),
+                        towel_count=rnd.choice([0, 0, 0, 1]),
+                    )
+                    for room in rnd.sample(rooms, 40)
+                ]
+                crud.create_cleaning_records(db, records, date)
+    return list(MONTHS)
+
+def _json(value):
+    return json.dumps(value, sort_keys=True, default=float)
+
+def _month_dates(year_month):
+    return [f"{year_month}-{d:02d}" for d in range(1, MONTHS[year_month] + 1)]
+
+def test_cube_reports_match_scoring(db, seeded):
+    cube._cache.clear()
+    for year_month in seeded:
+        for date in _month_dates(year_month):
+            day = crud.day_number(date)
+            assert _json(crud.get_vendor_report(db, date)) == _json(scoring.vendor_view(scoring.aggregate(db, day, day + 1))), date
+            assert _json(crud.get_daily_report(db, date)) == _json(scoring.daily_view(scoring.aggregate(db, day, day + 1))), date
+        start, end = crud.report_day_range(f"{year_month}-05", f"{year_month}-17")
+        assert _json(crud.get_vendor_report(db, f"{year_month}-05", f"{year_month}-17")) == \
+            _json(scoring.vendor_view(scoring.aggregate(db, start, end)))
+        start, end = crud.month_day_range(year_month)
+        assert _json(crud.get_monthly_report(db, year_month)) == _json(scoring.monthly_view(scoring.load_points(db, start, end)))
+        assert _json(crud.get_staff_monthly_report(db, year_month)["staff"]) == \
+            _json(scoring.staff_monthly_view(scoring.aggregate(db, start, end))["staff"])
+
+def _assert_range_matches_statements(db, months):
+    statements = [crud.get_staff_monthly_report(db, m) for m in months]
+    report = range_report.get_range_report(db, f"{months[0]}-01", _month_dates(months[-1])[-1], "month", "staff")
+    assert report["buckets"] == months
+    for i, statement in enumerate(statements):
+        assert report["totals"][i] == pytest.approx(statement["totals"]["hotel"])
+        by_name = {}
+        for series in report["series"]:
+            by_name[series["key"]] = by_name.get(series["key"], 0) + series["points"][i]
+        for staff in statement["staff"]:
+            assert by_name.get(staff["name"], 0) == pytest.approx(staff["total_points"]), (statement["year_month"], staff["name"])
+
+def test_range_report_matches_staff_statement(db, seeded):
+    _assert_range_matches_statements(db, seeded)
+
+    crud.lock_month(db, "2024-02", 1)
+    assert archive.archive_month(db, "2024-02")["rows"] > 0
+    assert not db.query(models.CleaningRecord).filter(models.CleaningRecord.date.like("2024-02-%")).count()
+    _assert_range_matches_statements(db, seeded)
+
+def _report_state(db, months):
+    cube._cache.clear()
+    out = {}
+    for year_month in months:
+        for date in _month_dates(year_month):
+            out["raw", date] = [
+                (r["id"], r["room_id"], r["bed_staff_id"], r["bath_staff_id"], r["towel_count"], r["status"])
+                if isinstance(r, dict) else (r.id, r.room_id, r.bed_staff_id, r.bath_staff_id, r.towel_count, r.status)
+                for r in crud.get_raw_records(db, date)
+            ]
+            out["vendor", date] = crud.get_vendor_report(db, date)
+        out["monthly", year_month] = crud.get_monthly_report(db, year_month)
+        out["staff", year_month] = crud.get_staff_monthly_report(db, year_month)
+    out["range"] = range_report.get_range_report(db, f"{months[0]}-01", _month_dates(months[-1])[-1], "day", "staff")
+    db.rollback()
+    return {repr(k): _json(v) for k, v in out.items()}
+
+def test_backup_round_trip_with_archived_month(db, seeded):
+    if not archive.entries(db):
+        crud.lock_month(db, "2024-02", 1)
+        archive.archive_month(db, "2024-02")
+    before = _report_state(db, seeded)
+    total = db.query(models.CleaningRecord).count() + sum(e.rows for e in archive.entries(db))
+
+    data = b"".join(backup.iter_backup())
+    counts = backup.restore_backup(db, io.BytesIO(data))
+
+    assert counts["cleaning_records"] == total
+    assert db.query(models.CleaningRecord).count() == total # the archived month is back in the table
+    assert archive.entries(db) == []
+    assert _report_state(db, seeded) == before